@@ -1,4 +1,7 @@
 import time
+from typing import Iterable, Iterator
+
+import numpy as np
 
 EXAMPLE = """
 L68
@@ -65,6 +68,141 @@ def get_zero_crossings_part2(increments: list[int]) -> int:
     return counter
 
 
+def decode_instructions(chunk: bytes) -> np.ndarray:
+    """
+    Decode a block of complete instruction records (e.g., b"L68\nR48\n") into an int32 array of
+    increments without touching the single records in Python. Only per-line arrays are built:
+    the amounts are accumulated digit position by digit position (at most 10 for int32), each
+    step reading the next digit of all lines that are long enough. Apart from the chunk itself,
+    the memory peak is a small multiple (about 5x) of the chunk size.
+
+    """
+    data = np.frombuffer(chunk, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int32)
+    # Offsets of 32 bits suffice for chunks below 2 GB and halve the size of the line arrays
+    offset_dtype = np.int32 if len(data) < np.iinfo(np.int32).max else np.int64
+    newline_idcs = np.flatnonzero(data == ord("\n")).astype(offset_dtype)
+    line_starts = np.concatenate((np.zeros(1, dtype=offset_dtype), newline_idcs + 1))
+    line_ends = np.concatenate((newline_idcs, np.array([len(data)], dtype=offset_dtype)))
+    del newline_idcs
+    # Strip "\r" of "\r\n" line endings and skip empty lines
+    line_ends -= (line_ends > line_starts) & (data[line_ends - 1] == ord("\r"))
+    is_nonempty = line_ends > line_starts
+    line_starts = line_starts[is_nonempty]
+    line_ends = line_ends[is_nonempty]
+    if len(line_starts) == 0:
+        return np.zeros(0, dtype=np.int32)
+
+    directions = data[line_starts]
+    unknown_directions = (directions != ord("L")) & (directions != ord("R"))
+    if unknown_directions.any():
+        raise ValueError(f"Unknown direction '{chr(directions[unknown_directions][0])}'.")
+
+    num_digits = line_ends - line_starts - 1
+    del line_ends
+    if num_digits.max() > 10:
+        raise ValueError("Instruction amounts must fit into int32.")
+    num_digits = num_digits.astype(np.int8)
+    # Append the digits in place. Lines that are too short for the current digit position read
+    # some other byte, which is ignored.
+    amounts = np.zeros(len(line_starts), dtype=np.int64)
+    for position in range(1, int(num_digits.max()) + 1):
+        has_digit = num_digits >= position
+        digits = data[np.minimum(line_starts + position, len(data) - 1)] - np.uint8(ord("0"))
+        if (has_digit & (digits > 9)).any():
+            raise ValueError("Instructions must consist of a direction followed by digits only.")
+        np.multiply(amounts, 10, out=amounts, where=has_digit)
+        np.add(amounts, digits, out=amounts, where=has_digit)
+    if amounts.max() > np.iinfo(np.int32).max:
+        raise ValueError("Instruction amounts must fit into int32.")
+
+    increments = amounts.astype(np.int32)
+    del amounts
+    np.negative(increments, out=increments, where=directions == ord("L"))
+
+    return increments
+
+
+def iter_increment_blocks(path: str, chunk_size: int = 1 << 22) -> Iterator[np.ndarray]:
+    # Read the file in binary chunks of `chunk_size` bytes. A record that is cut by the end of a
+    # chunk is carried over to the next one, so only complete records are decoded.
+    remainder = b""
+    with open(path, "rb") as fh:
+        while chunk := fh.read(chunk_size):
+            chunk = remainder + chunk
+            cut = chunk.rfind(b"\n") + 1
+            remainder = chunk[cut:]
+            if cut:
+                yield decode_instructions(chunk[:cut])
+    if remainder.strip():
+        yield decode_instructions(remainder)
+
+
+def get_dial_positions(increments: np.ndarray, start_pos: int = 50) -> np.ndarray:
+    # Unwrapped dial positions before the first and after every instruction
+    positions = np.empty(len(increments) + 1, dtype=np.int64)
+    positions[0] = start_pos
+    np.cumsum(increments, dtype=np.int64, out=positions[1:])
+    positions[1:] += start_pos
+
+    return positions
+
+
+def count_zero_landings(increments: np.ndarray, start_pos: int = 50) -> tuple[int, int]:
+    # Return the number of landings on zero and the final dial position
+    positions = get_dial_positions(increments, start_pos) % 100
+
+    return int(np.count_nonzero(positions[1:] == 0)), int(positions[-1])
+
+
+def count_zero_crossings(increments: np.ndarray, start_pos: int = 50) -> tuple[int, int]:
+    # Return the number of zero crossings and the final dial position
+    increments = np.asarray(increments)
+    positions = get_dial_positions(increments, start_pos)
+    # Same logic as in `get_zero_crossings_part2`: the number of crossings of the branch cut at <0
+    # is the change of the unwrapped position's "turn index" (position // 100) per instruction
+    turns, positions = np.divmod(positions, 100)
+    turn_changes = np.diff(turns)
+    counter = int(np.abs(turn_changes, out=turn_changes).sum())
+    on_zero = positions == 0
+    turn_left = increments < 0
+    # i) Starting on a zero and turning left is erroneously counted as a crossing
+    counter -= int(np.count_nonzero(on_zero[:-1] & turn_left))
+    # ii) Reaching a zero from the right is not counted as a crossing
+    counter += int(np.count_nonzero(on_zero[1:] & turn_left))
+
+    return counter, int(positions[-1])
+
+
+def get_zero_crossings_part1_vectorized(increments: np.ndarray) -> int:
+    return count_zero_landings(increments)[0]
+
+
+def get_zero_crossings_part2_vectorized(increments: np.ndarray) -> int:
+    return count_zero_crossings(increments)[0]
+
+
+def get_zero_crossings_part1_streamed(increment_blocks: Iterable[np.ndarray]) -> int:
+    counter = 0
+    pos = 50
+    for increments in increment_blocks:
+        block_counter, pos = count_zero_landings(increments, pos)
+        counter += block_counter
+
+    return counter
+
+
+def get_zero_crossings_part2_streamed(increment_blocks: Iterable[np.ndarray]) -> int:
+    counter = 0
+    pos = 50
+    for increments in increment_blocks:
+        block_counter, pos = count_zero_crossings(increments, pos)
+        counter += block_counter
+
+    return counter
+
+
 if __name__ == "__main__":
     with open("../inputs/01.txt", "r") as fh:
         in_text = fh.read()
@@ -82,3 +220,29 @@ if __name__ == "__main__":
     res = get_zero_crossings_part2(increments_list)
     end = time.perf_counter()
     print(f"Part 2 Result: {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    increments_array = np.array(increments_list, dtype=np.int64)
+
+    # PART 1 (VECTORIZED)
+    start = time.perf_counter()
+    res = get_zero_crossings_part1_vectorized(increments_array)
+    end = time.perf_counter()
+    print(f"Part 1 Result (vectorized): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (VECTORIZED)
+    start = time.perf_counter()
+    res = get_zero_crossings_part2_vectorized(increments_array)
+    end = time.perf_counter()
+    print(f"Part 2 Result (vectorized): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 1 (STREAMED)
+    start = time.perf_counter()
+    res = get_zero_crossings_part1_streamed(iter_increment_blocks("../inputs/01.txt"))
+    end = time.perf_counter()
+    print(f"Part 1 Result (streamed): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (STREAMED)
+    start = time.perf_counter()
+    res = get_zero_crossings_part2_streamed(iter_increment_blocks("../inputs/01.txt"))
+    end = time.perf_counter()
+    print(f"Part 2 Result (streamed): {res}. Took {(end - start) * 1000:.2f} ms.")
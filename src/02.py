@@ -1,5 +1,8 @@
+import os
 import time
-from typing import Callable, Counter
+from typing import Callable, Iterator
+
+import numpy as np
 
 EXAMPLE = """
 11-22,95-115,998-1012,1188511880-1188511890,222220-222224,
@@ -19,47 +22,99 @@ def parse_input(text: str) -> list[tuple[int, int]]:
     return id_ranges
 
 
-def get_invalid_ids_part1(id_range: tuple[int, int]) -> list[int]:
-    out = []
-    for i in range(id_range[0], id_range[1] + 1):
-        i_str = str(i)
-        i_digits = len(i_str)
-        first_half = i_str[:i_digits // 2]
-        second_half = i_str[i_digits // 2:]
-        if first_half == second_half:
-            out.append(i)
+def get_seed_lengths_part1(num_digits: int) -> list[int]:
+    # An ID is invalid if it is made of a digit sequence that is repeated exactly twice
+    return [num_digits // 2] if num_digits % 2 == 0 else []
+
+
+def get_seed_lengths_part2(num_digits: int) -> list[int]:
+    # An ID is invalid if it is made of a digit sequence that is repeated at least twice
+    return [k for k in range(1, num_digits // 2 + 1) if num_digits % k == 0]
+
+
+def get_repunit_multiplier(num_digits: int, seed_length: int) -> int:
+    # Multiplying a `seed_length`-digit seed with this number repeats the seed until the result
+    # has `num_digits` digits, e.g., 123 * 1001001 = 123123123
+    return (10 ** num_digits - 1) // (10 ** seed_length - 1)
+
+
+def get_seed_bounds(
+    id_range: tuple[int, int], num_digits: int, seed_length: int
+) -> tuple[int, int]:
+    # Smallest and largest seed (without leading zeros) whose repetition lies within `id_range`.
+    # If there is no such seed, the lower bound is larger than the upper one.
+    multiplier = get_repunit_multiplier(num_digits, seed_length)
+    seed_low = max(10 ** (seed_length - 1), -(-id_range[0] // multiplier))
+    seed_high = min(10 ** seed_length - 1, id_range[1] // multiplier)
+
+    return seed_low, seed_high
+
+
+def generate_invalid_ids(
+    id_range: tuple[int, int], seed_lengths_getter: Callable[[int], list[int]]
+) -> Iterator[int]:
+    """
+    Yield the invalid IDs within `id_range` in ascending order. Instead of checking every single
+    ID, we build the invalid ones directly: for every number of digits and every allowed seed
+    length, each seed times the corresponding repunit multiplier is an invalid ID. IDs that are
+    built by several seed lengths (e.g., 1111 = 1 * 1111 = 11 * 101) are only yielded once.
+
+    """
+    for num_digits in range(len(str(id_range[0])), len(str(id_range[1])) + 1):
+        invalid_ids = set()
+        for seed_length in seed_lengths_getter(num_digits):
+            multiplier = get_repunit_multiplier(num_digits, seed_length)
+            seed_low, seed_high = get_seed_bounds(id_range, num_digits, seed_length)
+            invalid_ids.update(seed * multiplier for seed in range(seed_low, seed_high + 1))
+        yield from sorted(invalid_ids)
 
-    return out
+
+def get_invalid_ids_part1(id_range: tuple[int, int]) -> list[int]:
+    return list(generate_invalid_ids(id_range, get_seed_lengths_part1))
 
 
 def get_invalid_ids_part2(id_range: tuple[int, int]) -> list[int]:
-    out = []
-    for i in range(id_range[0], id_range[1] + 1):
-        i_str = str(i)
-        i_digits = len(i_str)
-        digits_counter = dict(Counter(i_str))
-
-        # If the number `i` contains a repeated sequence,
-        # i) every digit must occur at least twice
-        if all(val > 1 for val in digits_counter.values()):
-            min_freq = min(digits_counter.values())
-            # ii) the occurrence of every digit must be an integer multiple of the occurrence of
-            #     the least-frequent digit
-            if all(val % min_freq == 0 for val in digits_counter.values()):
-                sequence_length = i_digits // min_freq
-                # iii) the overall number of digits must be an integer multiple of the sequence
-                #      length, which is determined by the occurrence of the least-frequent digit
-                if i_digits % sequence_length == 0:
-                    # If the three preconditions above are met, we know that any repeated sequence
-                    # (if it is there) must be of length `sequence_length`.
-                    for n in range(min_freq - 1):
-                        if (
-                            i_str[n * sequence_length:(n + 1) * sequence_length] !=
-                            i_str[(n + 1) * sequence_length:(n + 2) * sequence_length]
-                        ):
-                            break
-                    else:
-                        out.append(i)
+    return list(generate_invalid_ids(id_range, get_seed_lengths_part2))
+
+
+def sum_periodic_ids(id_range: tuple[int, int], num_digits: int, seed_length: int) -> int:
+    # All `num_digits`-digit IDs within `id_range` that repeat a `seed_length`-digit seed are
+    # `multiplier * seed` for consecutive seeds => Arithmetic series
+    seed_low, seed_high = get_seed_bounds(id_range, num_digits, seed_length)
+    if seed_low > seed_high:
+        return 0
+    multiplier = get_repunit_multiplier(num_digits, seed_length)
+
+    return multiplier * (seed_low + seed_high) * (seed_high - seed_low + 1) // 2
+
+
+def sum_invalid_ids_in_range(
+    id_range: tuple[int, int], seed_lengths_getter: Callable[[int], list[int]]
+) -> int:
+    """
+    Sum the invalid IDs within `id_range` without enumerating them. An ID that repeats a seed of
+    length `k` also repeats a seed of length `m` whenever `k` divides `m`. To count every ID only
+    once, we attribute it to its shortest (primitive) seed length: the sum over IDs with primitive
+    seed length `p` is the sum over all IDs repeating a `p`-digit seed minus the sums over the
+    primitive seed lengths that are proper divisors of `p`.
+
+    """
+    out = 0
+    for num_digits in range(len(str(id_range[0])), len(str(id_range[1])) + 1):
+        primitive_seed_lengths = sorted(
+            {
+                p
+                for seed_length in seed_lengths_getter(num_digits)
+                for p in range(1, seed_length + 1)
+                if seed_length % p == 0
+            }
+        )
+        primitive_sums: dict[int, int] = {}
+        for p in primitive_seed_lengths:
+            primitive_sums[p] = sum_periodic_ids(id_range, num_digits, p) - sum(
+                primitive_sums[q] for q in primitive_sums if p % q == 0
+            )
+        out += sum(primitive_sums.values())
 
     return out
 
@@ -75,6 +130,123 @@ def sum_invalid_ids(
     return out
 
 
+def sum_invalid_ids_closed_form(
+        id_ranges: list[tuple[int, int]],
+        seed_lengths_getter: Callable[[int], list[int]]
+) -> int:
+    out = 0
+    for id_range in id_ranges:
+        out += sum_invalid_ids_in_range(id_range, seed_lengths_getter)
+
+    return out
+
+
+def get_seed_length_masks(
+    seed_lengths_getter: Callable[[int], list[int]], max_num_digits: int
+) -> np.ndarray:
+    # One bit mask of the allowed seed lengths per number of digits. Stored with the index, it
+    # tells which rule (e.g., part 1 or part 2) the index was built for.
+    return np.array(
+        [
+            sum(1 << seed_length for seed_length in seed_lengths_getter(num_digits))
+            for num_digits in range(1, max_num_digits + 1)
+        ],
+        dtype=np.int64,
+    )
+
+
+def build_invalid_ids_index(
+    seed_lengths_getter: Callable[[int], list[int]], max_num_digits: int = 12
+) -> np.ndarray:
+    """
+    Build a flat index of all invalid IDs with at most `max_num_digits` digits. The returned array
+    starts with a header of `max_num_digits` and the seed length masks (see
+    `get_seed_length_masks`), followed by the sorted invalid IDs and their cumulative sums
+    (starting with 0, so they are one element longer). This way, the index is a single array that
+    can be stored as one file and memory-mapped when it is loaded again.
+
+    """
+    # Larger IDs and their sums would overflow int64
+    if not 1 <= max_num_digits <= 12:
+        raise ValueError(f"`max_num_digits` must be between 1 and 12, got {max_num_digits}.")
+    invalid_ids_blocks = []
+    for num_digits in range(1, max_num_digits + 1):
+        for seed_length in seed_lengths_getter(num_digits):
+            seeds = np.arange(10 ** (seed_length - 1), 10 ** seed_length, dtype=np.int64)
+            invalid_ids_blocks.append(seeds * get_repunit_multiplier(num_digits, seed_length))
+    # `np.unique` sorts the IDs and removes the ones built by several seed lengths
+    invalid_ids = np.unique(np.concatenate([np.zeros(0, dtype=np.int64), *invalid_ids_blocks]))
+    cumulative_sums = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(invalid_ids)])
+    header = np.concatenate(
+        [
+            np.array([max_num_digits], dtype=np.int64),
+            get_seed_length_masks(seed_lengths_getter, max_num_digits),
+        ]
+    )
+
+    return np.concatenate([header, invalid_ids, cumulative_sums])
+
+
+def split_invalid_ids_index(index: np.ndarray) -> tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+    # Inverse of the layout of `build_invalid_ids_index`: max_num_digits, seed length masks,
+    # invalid IDs and cumulative sums
+    max_num_digits = int(index[0])
+    header_length = max_num_digits + 1
+    num_invalid_ids = (index.shape[0] - header_length - 1) // 2
+
+    return (
+        max_num_digits,
+        index[1:header_length],
+        index[header_length:header_length + num_invalid_ids],
+        index[header_length + num_invalid_ids:],
+    )
+
+
+def save_invalid_ids_index(index: np.ndarray, path: str) -> None:
+    # Write through a file handle, since `np.save` would append ".npy" to any other file name
+    with open(path, "wb") as fh:
+        np.save(fh, index, allow_pickle=False)
+
+
+def load_invalid_ids_index(path: str) -> np.ndarray:
+    return np.load(path, mmap_mode="r", allow_pickle=False)
+
+
+def get_invalid_ids_index(
+    path: str, seed_lengths_getter: Callable[[int], list[int]], max_num_digits: int = 12
+) -> np.ndarray:
+    # Build the index only once and memory-map it on later runs (unless the stored index was built
+    # for a different number of digits or different seed lengths)
+    if os.path.exists(path):
+        index = load_invalid_ids_index(path)
+        stored_max_num_digits, seed_length_masks, _, _ = split_invalid_ids_index(index)
+        if stored_max_num_digits == max_num_digits and np.array_equal(
+            seed_length_masks, get_seed_length_masks(seed_lengths_getter, max_num_digits)
+        ):
+            return index
+        del index
+    save_invalid_ids_index(build_invalid_ids_index(seed_lengths_getter, max_num_digits), path)
+
+    return load_invalid_ids_index(path)
+
+
+def sum_invalid_ids_indexed(id_ranges: list[tuple[int, int]], index: np.ndarray) -> int:
+    max_num_digits, _, invalid_ids, cumulative_sums = split_invalid_ids_index(index)
+    max_covered_id = 10 ** max_num_digits - 1
+    if any(id_range[1] > max_covered_id for id_range in id_ranges):
+        raise ValueError(
+            f"Index only covers IDs up to {max_covered_id}. Rebuild it with more digits."
+        )
+    bounds = np.array(id_ranges, dtype=np.int64).reshape(-1, 2)
+    # Each range sum is the difference of two cumulative sums
+    low_idcs = np.searchsorted(invalid_ids, bounds[:, 0], side="left")
+    high_idcs = np.searchsorted(invalid_ids, bounds[:, 1], side="right")
+    range_sums = cumulative_sums[high_idcs] - cumulative_sums[low_idcs]
+
+    # Sum the (possibly overlapping) ranges with Python ints to prevent an overflow
+    return sum(map(int, range_sums))
+
+
 if __name__ == "__main__":
     with open("../inputs/02.txt", "r") as fh:
         in_text = fh.read()
@@ -92,3 +264,20 @@ if __name__ == "__main__":
     res = sum_invalid_ids(ranges, get_invalid_ids_part2)
     end = time.perf_counter()
     print(f"Part 2 Result: {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 1 AND PART 2 (CLOSED FORM)
+    for part, seed_lengths_getter in ((1, get_seed_lengths_part1), (2, get_seed_lengths_part2)):
+        start = time.perf_counter()
+        res = sum_invalid_ids_closed_form(ranges, seed_lengths_getter)
+        end = time.perf_counter()
+        print(f"Part {part} Result (closed form): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 1 AND PART 2 (BATCHED RANGE QUERIES ON A PRECOMPUTED INDEX)
+    for part, seed_lengths_getter in ((1, get_seed_lengths_part1), (2, get_seed_lengths_part2)):
+        invalid_ids_index = get_invalid_ids_index(
+            f"../inputs/02_index_part{part}.npy", seed_lengths_getter
+        )
+        start = time.perf_counter()
+        res = sum_invalid_ids_indexed(ranges, invalid_ids_index)
+        end = time.perf_counter()
+        print(f"Part {part} Result (indexed): {res}. Took {(end - start) * 1000:.2f} ms.")
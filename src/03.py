@@ -1,8 +1,9 @@
-import functools
 import time
 
 import numpy as np
 
+from grid_loader import build_lookup_table, load_grid, parse_grid
+
 
 EXAMPLE = """
 987654321111111
@@ -12,53 +13,67 @@ EXAMPLE = """
 """
 
 
-def parse_input(text: str) -> list[str]:
-    return [line.strip() for line in text.strip().split("\n")]
-
-
-@functools.cache
-def get_max_joltage(row_str_repr: str, sequence_length: int) -> int:
-    row = np.array(list(map(int, list(row_str_repr))))
-    row_length = len(row)
-    max_digit = np.max(row)
-    if sequence_length == 1:
-        return max_digit
-    for n in range(max_digit, 0, -1):
-        highest_first_digit_positions = np.where(row == n)[0]
-        relevant_highest_first_digit_positions = highest_first_digit_positions[np.where(
-            highest_first_digit_positions < row_length - (
-                sequence_length - 1))]
-        if relevant_highest_first_digit_positions.shape[0] == 0:
-            # Digit does not occur in the row OR all occurrences of the digit are so late in the row
-            # that a sequence of length `sequence_length` can't be formed. Continue with the next
-            # smaller number in this case.
-            continue
-        highest_tail_candidates: list[int] = []
-        for position in relevant_highest_first_digit_positions:
-            highest_tail_candidates.append(
-                get_max_joltage(
-                    row_str_repr[position + 1:], sequence_length - 1
-                )
+DIGIT_LOOKUP_TABLE = build_lookup_table({str(digit): digit for digit in range(10)})
+
+
+def parse_input(text: str) -> np.ndarray:
+    # uint8 matrix of the digits of all rows
+    return parse_grid(text, DIGIT_LOOKUP_TABLE)
+
+
+def get_max_joltages(digit_matrix: np.ndarray, sequence_length: int) -> np.ndarray:
+    """
+    Find the largest subsequence of length `sequence_length` for every row of `digit_matrix` at
+    once. For each row, we keep a stack of selected digits and go through the digits from left to
+    right: as long as the current digit is larger than the top of the stack and enough digits are
+    left to fill the stack again, the top of the stack is dropped. Afterward, the current digit is
+    pushed if the stack is not full yet. Every digit is pushed and popped at most once, so the
+    runtime is linear in the row length, and all rows are processed in the same pass.
+
+    """
+    num_rows, row_length = digit_matrix.shape
+    if not 1 <= sequence_length <= row_length:
+        raise ValueError(f"Sequence of length {sequence_length} could not be found.")
+    stacks = np.zeros((num_rows, sequence_length), dtype=np.uint8)
+    stack_sizes = np.zeros(num_rows, dtype=np.intp)
+    num_drops_left = np.full(num_rows, row_length - sequence_length, dtype=np.intp)
+    row_idcs = np.arange(num_rows)
+    for digits in digit_matrix.T:
+        while True:
+            # Index -1 for empty stacks is harmless, since these are masked out anyway
+            pop = (
+                (stack_sizes > 0)
+                & (num_drops_left > 0)
+                & (stacks[row_idcs, stack_sizes - 1] < digits)
             )
+            if not pop.any():
+                break
+            stack_sizes -= pop
+            num_drops_left -= pop
+        push = stack_sizes < sequence_length
+        stacks[row_idcs[push], stack_sizes[push]] = digits[push]
+        stack_sizes += push
+        num_drops_left -= ~push
 
-        return n * 10 ** (sequence_length - 1) + max(highest_tail_candidates)
+    # Joltages with more than 18 digits don't fit into int64 => Use Python ints in that case
+    if sequence_length <= 18:
+        weights = 10 ** np.arange(sequence_length - 1, -1, -1, dtype=np.int64)
+        return stacks.astype(np.int64) @ weights
+    weights = np.array([10 ** e for e in range(sequence_length - 1, -1, -1)], dtype=object)
 
-    raise ValueError(f"Sequence of length {sequence_length} could not be found.")
+    return stacks.astype(object) @ weights
 
 
-def sum_max_joltages(rows: list[str], sequence_length: int) -> int:
-    max_joltages = []
-    for row in rows:
-        max_joltages.append(get_max_joltage(row, sequence_length))
+def get_max_joltage(row_str_repr: str, sequence_length: int) -> int:
+    return int(get_max_joltages(parse_input(row_str_repr), sequence_length)[0])
 
-    return sum(max_joltages)
 
+def sum_max_joltages(digit_matrix: np.ndarray, sequence_length: int) -> int:
+    return sum(map(int, get_max_joltages(digit_matrix, sequence_length)))
 
-if __name__ == "__main__":
-    with open("../inputs/03.txt", "r") as fh:
-        in_text = fh.read()
 
-    battery_grid = parse_input(in_text)
+if __name__ == "__main__":
+    battery_grid = load_grid("../inputs/03.txt", DIGIT_LOOKUP_TABLE)
 
     # PART 1
     start = time.perf_counter()
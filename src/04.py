@@ -1,7 +1,20 @@
+import os
+import shutil
+import tempfile
 import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
 
 import numpy as np
 
+from grid_loader import (
+    build_lookup_table,
+    convert_char_matrix,
+    get_char_matrix,
+    load_grid,
+    parse_grid,
+)
+
 
 EXAMPLE = """
 ..@@.@@@@.
@@ -17,19 +30,13 @@ EXAMPLE = """
 """
 
 
+PAPER_ROLL_LOOKUP_TABLE = build_lookup_table({".": 0, "@": 1})
+
+
 def parse_input(text: str) -> np.ndarray:
-    rows = text.strip().split("\n")
-    n_rows = len(rows)
-    n_cols = len(rows[0])
     # Pad array with zeros (walls count like "no neighbor") to avoid dedicated
     # handling of the array boundaries in `get_num_accessible_paper_rolls_in_one_step`
-    grid = np.zeros((n_rows + 2, n_cols + 2), dtype=int)
-    for i, row in enumerate(rows):
-        for j, pos in enumerate(row):
-            if pos == "@":
-                grid[i + 1, j + 1] = 1
-
-    return grid
+    return parse_grid(text, PAPER_ROLL_LOOKUP_TABLE, padding=1)
 
 
 def get_num_accessible_paper_rolls_in_one_step(
@@ -59,24 +66,224 @@ def get_num_accessible_paper_rolls_in_one_step(
     return num_accessible_paper_rolls, new_grid
 
 
-def get_overall_num_accessible_paper_rolls(grid: np.ndarray) -> int:
+def count_neighbors(grid: np.ndarray) -> np.ndarray:
+    # Number of occupied neighbors of every interior cell of the padded grid, summed up from the
+    # eight shifted views of the grid
+    n_rows, n_cols = grid.shape
+    num_neighbors = np.zeros((n_rows - 2, n_cols - 2), dtype=np.uint8)
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            if di == 0 and dj == 0:
+                continue
+            num_neighbors += grid[1 + di:n_rows - 1 + di, 1 + dj:n_cols - 1 + dj]
+
+    return num_neighbors
+
+
+def get_num_accessible_paper_rolls_in_one_step_vectorized(
+    grid: np.ndarray,
+) -> tuple[int, np.ndarray]:
+    interior = grid[1:-1, 1:-1].astype(bool)
+    accessible = interior & (count_neighbors(grid) < 4)
+    new_grid = grid.copy()
+    new_grid[1:-1, 1:-1][accessible] = 0
+
+    return int(np.count_nonzero(accessible)), new_grid
+
+
+def get_overall_num_accessible_paper_rolls(
+    grid: np.ndarray,
+    one_step_function: Callable[[np.ndarray], tuple[int, np.ndarray]] = (
+        get_num_accessible_paper_rolls_in_one_step
+    ),
+) -> int:
     overall_num_accessible_paper_rolls = 0
     num_accessible_paper_rolls = -1
     while num_accessible_paper_rolls != 0:
-        num_accessible_paper_rolls, new_grid = (
-            get_num_accessible_paper_rolls_in_one_step(grid)
-        )
+        num_accessible_paper_rolls, new_grid = one_step_function(grid)
         overall_num_accessible_paper_rolls += num_accessible_paper_rolls
         grid = new_grid
 
     return overall_num_accessible_paper_rolls
 
 
-if __name__ == "__main__":
-    with open("../inputs/04.txt", "r") as fh:
-        in_text = fh.read()
+def get_removal_rounds(grid: np.ndarray) -> np.ndarray:
+    """
+    Return an array of the padded grid's shape that holds the round in which each paper roll is
+    removed (0 for cells that are empty or whose roll is never removed). Instead of rescanning the
+    whole grid every round, we keep the neighbor counts up to date and only re-examine the cells
+    next to the rolls that were removed in the previous round, so the overall work is proportional
+    to the number of removals.
+
+    """
+    n_cols = grid.shape[1]
+    occupied = grid.astype(bool).ravel()
+    num_neighbors = np.zeros(grid.shape, dtype=np.int8)
+    num_neighbors[1:-1, 1:-1] = count_neighbors(grid)
+    num_neighbors = num_neighbors.ravel()
+    removal_rounds = np.zeros(grid.size, dtype=np.int32)
+    neighbor_offsets = np.array(
+        [-n_cols - 1, -n_cols, -n_cols + 1, -1, 1, n_cols - 1, n_cols, n_cols + 1]
+    )
+    # The padding is never occupied, so the frontier never leaves the grid
+    frontier = np.flatnonzero(occupied)
+    round_idx = 0
+    while True:
+        removed = frontier[occupied[frontier] & (num_neighbors[frontier] < 4)]
+        if len(removed) == 0:
+            break
+        round_idx += 1
+        removal_rounds[removed] = round_idx
+        occupied[removed] = False
+        neighbors, num_removed_neighbors = np.unique(
+            (removed[:, None] + neighbor_offsets).ravel(), return_counts=True
+        )
+        num_neighbors[neighbors] -= num_removed_neighbors.astype(np.int8)
+        frontier = neighbors[occupied[neighbors]]
+
+    return removal_rounds.reshape(grid.shape)
+
+
+def get_overall_num_accessible_paper_rolls_incremental(grid: np.ndarray) -> int:
+    return int(np.count_nonzero(get_removal_rounds(grid)))
+
+
+def pack_grid(input_path: str, packed_path: str, block_rows: int = 4096) -> tuple[int, int]:
+    """
+    Convert the input file into a bit-packed grid (one bit per cell, eight cells per byte along
+    the rows) that is stored as a raw file at `packed_path`. The input is memory-mapped and
+    converted in blocks of `block_rows` rows, so the conversion never holds the whole grid in
+    memory. Return the shape of the unpacked grid (without padding).
+
+    """
+    char_matrix = get_char_matrix(np.memmap(input_path, dtype=np.uint8, mode="r"))
+    n_rows, n_cols = char_matrix.shape
+    packed = np.memmap(packed_path, dtype=np.uint8, mode="w+", shape=(n_rows, (n_cols + 7) // 8))
+    for row_start in range(0, n_rows, block_rows):
+        block = convert_char_matrix(
+            char_matrix[row_start:row_start + block_rows], PAPER_ROLL_LOOKUP_TABLE
+        )
+        packed[row_start:row_start + block_rows] = np.packbits(block, axis=1)
+    packed.flush()
+
+    return n_rows, n_cols
 
-    paper_roll_grid = parse_input(in_text)
+
+def erode_tile(
+    current_path: str,
+    next_path: str,
+    packed_shape: tuple[int, int],
+    tile: tuple[int, int, int, int],
+) -> int:
+    """
+    Remove the accessible paper rolls of one tile of the bit-packed grid at `current_path` and
+    write the tile's new state to the grid at `next_path`. `tile` is given as
+    (row_start, row_end, byte_col_start, byte_col_end). The tile is read together with a halo of
+    one row and one byte (i.e., eight cells) on each side, which is filled with zeros at the grid
+    boundaries. Return the number of removed paper rolls.
+
+    """
+    row_start, row_end, byte_col_start, byte_col_end = tile
+    n_rows, n_byte_cols = packed_shape
+    current = np.memmap(current_path, dtype=np.uint8, mode="r", shape=packed_shape)
+    halo = np.zeros((row_end - row_start + 2, byte_col_end - byte_col_start + 2), dtype=np.uint8)
+    src_rows = slice(max(row_start - 1, 0), min(row_end + 1, n_rows))
+    src_cols = slice(max(byte_col_start - 1, 0), min(byte_col_end + 1, n_byte_cols))
+    halo[
+        src_rows.start - row_start + 1:src_rows.stop - row_start + 1,
+        src_cols.start - byte_col_start + 1:src_cols.stop - byte_col_start + 1,
+    ] = current[src_rows, src_cols]
+    local_grid = np.unpackbits(halo, axis=1)
+
+    # `count_neighbors` skips the outermost cells of `local_grid`, so the tile's own cells start at
+    # column 7 of its output
+    tile_width = 8 * (byte_col_end - byte_col_start)
+    num_neighbors = count_neighbors(local_grid)[:, 7:7 + tile_width]
+    tile_grid = local_grid[1:-1, 8:8 + tile_width].astype(bool)
+    accessible = tile_grid & (num_neighbors < 4)
+    # Always write the tile, since the other buffer might still hold an older state of it
+    next_ = np.memmap(next_path, dtype=np.uint8, mode="r+", shape=packed_shape)
+    next_[row_start:row_end, byte_col_start:byte_col_end] = np.packbits(
+        tile_grid & ~accessible, axis=1
+    )
+    next_.flush()
+
+    return int(np.count_nonzero(accessible))
+
+
+def get_overall_num_accessible_paper_rolls_tiled(
+    packed_path: str,
+    shape: tuple[int, int],
+    tile_shape: tuple[int, int] = (4096, 4096),
+    max_workers: int | None = None,
+) -> int:
+    """
+    Tiled, multi-process variant of `get_overall_num_accessible_paper_rolls` for bit-packed grids
+    (see `pack_grid`) that don't fit into memory. Every round, the tiles are eroded in parallel:
+    the workers read the current state (including the halos of the neighboring tiles) from one
+    memory-mapped buffer and write the new state to another one, so the halo updates of a round
+    become visible to all workers in the next round. Tiles are only processed again if they or
+    one of their neighboring tiles changed in the previous round. The file at `packed_path` is
+    not modified.
+
+    """
+    n_rows, n_cols = shape
+    packed_shape = (n_rows, (n_cols + 7) // 8)
+    # Tiles must cover whole bytes, so that the workers never write to the same byte
+    tile_rows = tile_shape[0]
+    tile_byte_cols = max(tile_shape[1] // 8, 1)
+    row_starts = range(0, n_rows, tile_rows)
+    byte_col_starts = range(0, packed_shape[1], tile_byte_cols)
+    tiles = [
+        (
+            row_start,
+            min(row_start + tile_rows, n_rows),
+            byte_col_start,
+            min(byte_col_start + tile_byte_cols, packed_shape[1]),
+        )
+        for row_start in row_starts
+        for byte_col_start in byte_col_starts
+    ]
+    active = np.ones((len(row_starts), len(byte_col_starts)), dtype=bool)
+
+    overall_num_accessible_paper_rolls = 0
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(packed_path))) as tmp:
+        # Double buffering: Both buffers start with the same state. Skipped tiles did not change
+        # in the previous round, so they hold the same state in both buffers.
+        current_path = os.path.join(tmp, "current.bin")
+        next_path = os.path.join(tmp, "next.bin")
+        shutil.copyfile(packed_path, current_path)
+        shutil.copyfile(packed_path, next_path)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            while active.any():
+                active_tile_idcs = np.flatnonzero(active)
+                num_removed = np.zeros(active.size, dtype=np.int64)
+                num_removed[active_tile_idcs] = list(
+                    executor.map(
+                        erode_tile,
+                        [current_path] * len(active_tile_idcs),
+                        [next_path] * len(active_tile_idcs),
+                        [packed_shape] * len(active_tile_idcs),
+                        [tiles[i] for i in active_tile_idcs],
+                    )
+                )
+                overall_num_accessible_paper_rolls += int(num_removed.sum())
+                # A tile must be re-examined if it or one of its neighbors lost paper rolls
+                changed = np.pad(num_removed.reshape(active.shape) > 0, 1)
+                active = np.zeros_like(changed)
+                for di in (-1, 0, 1):
+                    for dj in (-1, 0, 1):
+                        active[1:-1, 1:-1] |= changed[
+                            1 + di:changed.shape[0] - 1 + di, 1 + dj:changed.shape[1] - 1 + dj
+                        ]
+                active = active[1:-1, 1:-1]
+                current_path, next_path = next_path, current_path
+
+    return overall_num_accessible_paper_rolls
+
+
+if __name__ == "__main__":
+    paper_roll_grid = load_grid("../inputs/04.txt", PAPER_ROLL_LOOKUP_TABLE, padding=1)
 
     # PART 1
     start = time.perf_counter()
@@ -89,3 +296,32 @@ if __name__ == "__main__":
     res = get_overall_num_accessible_paper_rolls(paper_roll_grid)
     end = time.perf_counter()
     print(f"Part 2 Result: {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 1 (VECTORIZED)
+    start = time.perf_counter()
+    res, _ = get_num_accessible_paper_rolls_in_one_step_vectorized(paper_roll_grid)
+    end = time.perf_counter()
+    print(f"Part 1 Result (vectorized): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (VECTORIZED)
+    start = time.perf_counter()
+    res = get_overall_num_accessible_paper_rolls(
+        paper_roll_grid, get_num_accessible_paper_rolls_in_one_step_vectorized
+    )
+    end = time.perf_counter()
+    print(f"Part 2 Result (vectorized): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (INCREMENTAL)
+    start = time.perf_counter()
+    res = get_overall_num_accessible_paper_rolls_incremental(paper_roll_grid)
+    end = time.perf_counter()
+    print(f"Part 2 Result (incremental): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (TILED)
+    start = time.perf_counter()
+    paper_roll_grid_shape = pack_grid("../inputs/04.txt", "../inputs/04_packed.bin")
+    res = get_overall_num_accessible_paper_rolls_tiled(
+        "../inputs/04_packed.bin", paper_roll_grid_shape
+    )
+    end = time.perf_counter()
+    print(f"Part 2 Result (tiled): {res}. Took {(end - start) * 1000:.2f} ms.")
@@ -1,4 +1,8 @@
 import time
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+import numpy as np
 
 EXAMPLE = """
 3-5
@@ -25,75 +29,150 @@ def parse_input(text: str) -> tuple[list[list[int]], list[int]]:
     return ranges, ids
 
 
-def get_num_fresh_ids(ranges: list[list[int]], ids: list[int]) -> int:
-    counter = 0
-    for id_ in ids:
-        if any([r[0] <= id_ <= r[1] for r in ranges]):
-            counter += 1
+def get_id_ranges_without_overlaps(id_ranges: list[list[int]] | np.ndarray) -> np.ndarray:
+    """
+    Merge the (inclusive) ID ranges into disjoint ranges, returned as an (n, 2) int64 array that
+    is sorted by the starting points. Overlapping or adjacent ranges are coalesced into one range.
+    After sorting the ranges by their starting points, a new merged range begins wherever the
+    starting point lies behind the largest end point seen so far (plus one for adjacency).
+    The input is not modified.
+
+    """
+    id_ranges = np.asarray(id_ranges, dtype=np.int64).reshape(-1, 2)
+    if len(id_ranges) == 0:
+        return id_ranges.copy()
+    id_ranges = id_ranges[np.argsort(id_ranges[:, 0], kind="stable")]
+    max_ends = np.maximum.accumulate(id_ranges[:, 1])
+    is_new_range = np.empty(len(id_ranges), dtype=bool)
+    is_new_range[0] = True
+    is_new_range[1:] = id_ranges[1:, 0] > max_ends[:-1] + 1
+    new_range_idcs = np.flatnonzero(is_new_range)
+
+    return np.stack(
+        [
+            id_ranges[new_range_idcs, 0],
+            max_ends[np.append(new_range_idcs[1:] - 1, len(id_ranges) - 1)],
+        ],
+        axis=1,
+    )
+
+
+def get_fresh_mask(merged_ranges: np.ndarray, ids: list[int] | np.ndarray) -> np.ndarray:
+    # For disjoint, sorted ranges, an ID can only lie within the last range that starts at or
+    # before it
+    ids = np.asarray(ids, dtype=np.int64)
+    range_idcs = np.searchsorted(merged_ranges[:, 0], ids, side="right") - 1
+    is_fresh = range_idcs >= 0
+    is_fresh[is_fresh] = ids[is_fresh] <= merged_ranges[range_idcs[is_fresh], 1]
+
+    return is_fresh
+
+
+def get_num_fresh_ids(ranges: list[list[int]] | np.ndarray, ids: list[int] | np.ndarray) -> int:
+    return int(np.count_nonzero(get_fresh_mask(get_id_ranges_without_overlaps(ranges), ids)))
+
+
+def get_num_fresh_ids_streamed(path: str, chunk_size: int = 1 << 20) -> int:
+    # Only the ranges are held in memory. The IDs are read and checked in chunks of `chunk_size`
+    # lines, so memory stays flat regardless of the number of IDs.
+    with open(path, "r") as fh:
+        ranges = []
+        for line in fh:
+            if not line.strip():
+                if ranges:
+                    break
+                continue
+            ranges.append(list(map(int, line.split("-"))))
+        merged_ranges = get_id_ranges_without_overlaps(ranges)
+
+        counter = 0
+        while lines := list(islice(fh, chunk_size)):
+            # Blank lines are skipped, and anything else that is not an integer raises an error
+            ids = np.array([int(line) for line in lines if line.strip()], dtype=np.int64)
+            counter += int(np.count_nonzero(get_fresh_mask(merged_ranges, ids)))
 
     return counter
 
 
-def get_id_ranges_without_overlaps(id_ranges: list[list[int]]) -> list[list[int]]:
-    # For the following logic, we require the input ranges to be sorted in ascending order
-    # according to their starting point
-    id_ranges.sort(key=lambda x: x[0])
-    merged_ranges = []
-    for r in id_ranges:
-        for i, mr in enumerate(merged_ranges):
-            if r[0] > mr[1]:
-                # |-----mr-----|
-                #                  |---r---|
-                # No overlap of the "new" range `r` with the current subset `mr` of the merged
-                # ranges. `r` is right of `mr`, so directly jump to the next subset of the merged
-                # ranges
-                continue
-            if mr[0] <= r[1] <= mr[1]:
-                #  -----mr-----|
-                #  --r----|
-                # End point of `r` lies within `mr` => Simply extend `mr` to the left (the starting
-                # point of `r` might be located left to the starting point of `mr`) and we're done
-                mr[0] = min(r[0], mr[0])
-                break
-            elif r[1] > mr[1]:
-                # If the end point of `r` is right of the end point of `mr`, we have the most
-                # difficult case: `r` might extend into the next subset of `merged_ranges`.
-                # In any case, update the starting point of `mr`first
-                mr[0] = min(r[0], mr[0])
-                if i == len(merged_ranges) - 1 or r[1] < merged_ranges[i + 1][0]:
-                    # --merged_ranges[i]--|        |---merged_ranges[i + 1]--
-                    # -----------r------------|
-                    # No overlap with the next subset => simply extend `mr` to the right
-                    mr[1] = r[1]
-                    break
-                else:
-                    # --merged_ranges[i]--|        |---merged_ranges[i + 1]--
-                    # ------------------r------------------------------------
-                    #
-                    #                              |
-                    #                              V
-                    #
-                    # ------merged_ranges[i]------||---merged_ranges[i + 1]--
-                    #                              |------------------r------
-                    # Overlap with the next subset => Cut `r` at the overlap. `mr` is extended with
-                    # the left side of this cut, while we continue the loop with the right side of
-                    # the cut
-                    mr[1] = merged_ranges[i + 1][0] - 1
-                    r[0] = merged_ranges[i + 1][0]
-        else:
-            # No overlap of `r` with any subset of `merged_ranges`
-            merged_ranges.append(r)
-
-    return merged_ranges
-
-
-def get_num_possible_ids(id_ranges: list[list[int]]) -> int:
+class IntervalSet:
+    """
+    Mutable set of IDs, stored as disjoint, sorted, non-adjacent (inclusive) ranges, i.e., in the
+    same form as returned by `get_id_ranges_without_overlaps`. The starting and end points are
+    kept in two sorted lists, so that the ranges affected by an insertion, a deletion, or a
+    lookup are found by binary search in O(log n). The number of covered IDs is updated with
+    every modification.
+
+    """
+
+    def __init__(self, id_ranges: list[list[int]] | np.ndarray | None = None) -> None:
+        merged_ranges = get_id_ranges_without_overlaps([] if id_ranges is None else id_ranges)
+        self._starts: list[int] = merged_ranges[:, 0].tolist()
+        self._ends: list[int] = merged_ranges[:, 1].tolist()
+        self.num_ids = sum(end - start + 1 for start, end in zip(self._starts, self._ends))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __contains__(self, id_: int) -> bool:
+        i = bisect_right(self._starts, id_) - 1
+        return i >= 0 and id_ <= self._ends[i]
+
+    def _replace(self, i: int, j: int, starts: list[int], ends: list[int]) -> None:
+        # Replace the ranges `i` to `j - 1` by the given ones and update the number of IDs
+        self.num_ids -= sum(self._ends[k] - self._starts[k] + 1 for k in range(i, j))
+        self.num_ids += sum(end - start + 1 for start, end in zip(starts, ends))
+        self._starts[i:j] = starts
+        self._ends[i:j] = ends
+
+    def insert(self, start: int, end: int) -> None:
+        if start > end:
+            raise ValueError(f"Invalid range {start}-{end}.")
+        # All ranges that overlap with or are adjacent to the new one are merged with it
+        i = bisect_left(self._ends, start - 1)
+        j = bisect_right(self._starts, end + 1)
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+        self._replace(i, j, [start], [end])
+
+    def delete(self, start: int, end: int) -> None:
+        if start > end:
+            raise ValueError(f"Invalid range {start}-{end}.")
+        # Only the parts of the overlapping ranges that stick out of the deleted range remain
+        i = bisect_left(self._ends, start)
+        j = bisect_right(self._starts, end)
+        if i >= j:
+            return
+        remaining_starts = []
+        remaining_ends = []
+        if self._starts[i] < start:
+            remaining_starts.append(self._starts[i])
+            remaining_ends.append(start - 1)
+        if self._ends[j - 1] > end:
+            remaining_starts.append(end + 1)
+            remaining_ends.append(self._ends[j - 1])
+        self._replace(i, j, remaining_starts, remaining_ends)
+
+    def to_array(self) -> np.ndarray:
+        return np.array([self._starts, self._ends], dtype=np.int64).T.reshape(-1, 2)
+
+    def save(self, path: str) -> None:
+        # Write through a file handle, since `np.save` would append ".npy" to any other file name
+        with open(path, "wb") as fh:
+            np.save(fh, self.to_array(), allow_pickle=False)
+
+    @classmethod
+    def load(cls, path: str) -> "IntervalSet":
+        # The stored ranges are already merged, so merging them again is a cheap linear pass
+        return cls(np.load(path, allow_pickle=False))
+
+
+def get_num_possible_ids(id_ranges: list[list[int]] | np.ndarray | IntervalSet) -> int:
+    if isinstance(id_ranges, IntervalSet):
+        return id_ranges.num_ids
     id_ranges_without_overlaps = get_id_ranges_without_overlaps(id_ranges)
-    counter = 0
-    for id_range in id_ranges_without_overlaps:
-        counter += id_range[1] - id_range[0] + 1
 
-    return counter
+    return int((id_ranges_without_overlaps[:, 1] - id_ranges_without_overlaps[:, 0] + 1).sum())
 
 
 if __name__ == "__main__":
@@ -113,3 +192,16 @@ if __name__ == "__main__":
     res = get_num_possible_ids(fresh_ingredient_ranges)
     end = time.perf_counter()
     print(f"Part 2 Result: {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 1 (STREAMED)
+    start = time.perf_counter()
+    res = get_num_fresh_ids_streamed("../inputs/05.txt")
+    end = time.perf_counter()
+    print(f"Part 1 Result (streamed): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (INTERVAL SET)
+    fresh_ingredient_id_set = IntervalSet(fresh_ingredient_ranges)
+    start = time.perf_counter()
+    res = get_num_possible_ids(fresh_ingredient_id_set)
+    end = time.perf_counter()
+    print(f"Part 2 Result (interval set): {res}. Took {(end - start) * 1000:.2f} ms.")
@@ -1,5 +1,8 @@
+import math
 import re
 import time
+from contextlib import ExitStack
+from typing import Literal
 
 import numpy as np
 
@@ -83,8 +86,181 @@ def parse_input_part2(text: str) -> tuple[np.ndarray, np.ndarray]:
     return addition_numbers, multiplication_numbers
 
 
+def get_numbers_from_char_matrix(
+    number_chars: np.ndarray, operator_chars: np.ndarray, part: Literal[1, 2]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized counterpart of the parsers for a worksheet that is given as a uint8 character
+    matrix of the number lines plus the character row of the operators. The matrix must end with
+    a blank separator column, so that every block of it is complete. Separator columns are found
+    with a single reduction over the rows, and numbers are decoded as dot products of their
+    digits with positional weights (10 to the power of the number of digits behind the respective
+    digit), horizontally within each block for part 1 and vertically for part 2.
+
+    """
+    is_digit = number_chars != ord(" ")
+    digits = np.where(is_digit, number_chars.astype(np.int64) - ord("0"), 0)
+    is_separator = ~is_digit.any(axis=0)
+    is_block_start = ~is_separator & np.append(True, is_separator[:-1])
+    block_starts = np.flatnonzero(is_block_start)
+    num_blocks = len(block_starts)
+    if num_blocks == 0:
+        return np.zeros((0, 0), dtype=np.int64), np.ones((0, 0), dtype=np.int64)
+
+    # The operator of a block is the only non-blank character of the operator row within the block
+    multiply = np.maximum.reduceat(operator_chars, block_starts) == ord("*")
+
+    if part == 1:
+        # Number of digits right of each digit within the same block of the same row
+        num_digits_up_to = np.cumsum(is_digit, axis=1)
+        block_ends = np.flatnonzero(is_separator[1:] & ~is_separator[:-1])
+        num_digits_right = num_digits_up_to[:, block_ends][
+            :, np.cumsum(is_block_start) - 1
+        ] - num_digits_up_to
+        weighted_digits = digits * 10 ** np.where(is_digit, num_digits_right, 0)
+        numbers = np.add.reduceat(weighted_digits, block_starts, axis=1)
+        has_number = np.logical_or.reduceat(is_digit, block_starts, axis=1)
+        # Rows without a number in a block must not change the block's result
+        numbers = np.where(has_number, numbers, multiply.astype(np.int64))
+    elif part == 2:
+        num_digits_below = np.cumsum(is_digit[::-1], axis=0)[::-1] - is_digit
+        number_column_idcs = np.flatnonzero(~is_separator)
+        column_numbers = (digits * 10 ** num_digits_below).sum(axis=0)[number_column_idcs]
+        block_idcs = np.cumsum(is_block_start)[number_column_idcs] - 1
+        positions_in_blocks = number_column_idcs - block_starts[block_idcs]
+        block_widths = np.bincount(block_idcs, minlength=num_blocks)
+        numbers = np.where(multiply, 1, 0)[None, :].repeat(block_widths.max(initial=0), axis=0)
+        numbers[positions_in_blocks, block_idcs] = column_numbers
+
+        return (
+            numbers[:block_widths[~multiply].max(initial=0), ~multiply],
+            numbers[:block_widths[multiply].max(initial=0), multiply],
+        )
+    else:
+        raise ValueError(f"Invalid part: {part}")
+
+    return numbers[:, ~multiply], numbers[:, multiply]
+
+
+def parse_input_part2_vectorized(text: str) -> tuple[np.ndarray, np.ndarray]:
+    # Same as `parse_input_part2`, but without any per-character Python work
+    lines = text.strip().split("\n")
+    number_lines = lines[:-1]
+    assert len(set(len(line) for line in number_lines)) == 1
+    # Append a blank column at the end to terminate the last block, like in `parse_input_part2`
+    width = len(number_lines[0]) + 1
+    chars = np.frombuffer(
+        "".join(line.ljust(width) for line in lines).encode("ascii"), dtype=np.uint8
+    ).reshape(len(lines), width)
+
+    return get_numbers_from_char_matrix(chars[:-1], chars[-1], part=2)
+
+
+def get_line_offsets(path: str, chunk_size: int = 1 << 20) -> list[tuple[int, int]]:
+    # Starting offsets and lengths (without line endings) of all non-empty lines of the file,
+    # found by scanning the file in binary chunks
+    line_offsets = []
+    line_start = 0
+    with open(path, "rb") as fh:
+        offset = 0
+        while chunk := fh.read(chunk_size):
+            for newline_idx in np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n")):
+                line_offsets.append((line_start, offset + int(newline_idx) - line_start))
+                line_start = offset + int(newline_idx) + 1
+            offset += len(chunk)
+        line_offsets.append((line_start, offset - line_start))
+        # Exclude "\r" of "\r\n" line endings from the line lengths
+        for i, (line_start, line_length) in enumerate(line_offsets):
+            if line_length > 0:
+                fh.seek(line_start + line_length - 1)
+                if fh.read(1) == b"\r":
+                    line_offsets[i] = (line_start, line_length - 1)
+
+    return [(start, length) for start, length in line_offsets if length > 0]
+
+
+def get_grand_total_streamed(
+    path: str, part: Literal[1, 2], window_width: int = 1 << 16
+) -> int:
+    """
+    Compute the grand total without loading the whole worksheet. Every line gets its own file
+    cursor, and all cursors are advanced together in horizontal windows of `window_width`
+    characters. All blocks of the current window that are terminated by a separator column are
+    evaluated right away and added to the running total, while the last, possibly incomplete
+    block is carried over to the next window. This way, memory is proportional to the window
+    width (plus the width of the widest block) instead of the worksheet width.
+
+    """
+    line_offsets = get_line_offsets(path)
+    num_chars = max(line_length for _, line_length in line_offsets)
+    grand_total = 0
+    with ExitStack() as stack:
+        cursors = []
+        for line_start, _ in line_offsets:
+            cursor = stack.enter_context(open(path, "rb"))
+            cursor.seek(line_start)
+            cursors.append(cursor)
+        carry = np.zeros((len(cursors), 0), dtype=np.uint8)
+        for window_start in range(0, num_chars, window_width):
+            window_end = min(window_start + window_width, num_chars)
+            # Shorter lines are padded with blanks. Append a blank column at the end of the
+            # worksheet to terminate the last block.
+            width = window_end - window_start + (window_end == num_chars)
+            window = np.full((len(cursors), width), ord(" "), dtype=np.uint8)
+            for i, (cursor, (_, line_length)) in enumerate(zip(cursors, line_offsets)):
+                line_chars = cursor.read(max(min(window_end, line_length) - window_start, 0))
+                window[i, :len(line_chars)] = np.frombuffer(line_chars, dtype=np.uint8)
+            chars = np.concatenate([carry, window], axis=1)
+
+            separator_idcs = np.flatnonzero((chars[:-1] == ord(" ")).all(axis=0))
+            num_complete_chars = int(separator_idcs[-1]) + 1 if len(separator_idcs) else 0
+            carry = chars[:, num_complete_chars:]
+            addition_numbers, multiplication_numbers = get_numbers_from_char_matrix(
+                chars[:-1, :num_complete_chars], chars[-1, :num_complete_chars], part
+            )
+            grand_total += get_grand_totals(addition_numbers, multiplication_numbers)
+
+    return grand_total
+
+
+def get_bit_length_bounds(numbers: np.ndarray) -> np.ndarray:
+    # Upper bounds of the bit lengths of the absolute values. The conversion to float can only
+    # round up to the next power of two, which makes the bounds larger, but never smaller.
+    return np.frexp(np.abs(numbers).astype(float))[1]
+
+
+def sum_exactly(numbers: np.ndarray) -> int:
+    # The int64 sum is only used if it provably can't overflow
+    if numbers.size == 0:
+        return 0
+    if int(get_bit_length_bounds(numbers).max()) + math.ceil(math.log2(numbers.size)) < 63:
+        return int(numbers.sum())
+
+    return sum(map(int, numbers.ravel()))
+
+
+def multiply_columns_exactly(numbers: np.ndarray) -> tuple[np.ndarray, list[int]]:
+    """
+    Return the products of all columns of `numbers` whose products provably fit into int64
+    (as int64 array) and the products of the remaining columns (as Python ints). The product of
+    numbers with bit lengths b_1, ..., b_n is smaller than 2^(b_1 + ... + b_n), so a column can
+    be multiplied in int64 if its bit lengths add up to at most 63.
+
+    """
+    fits_int64 = get_bit_length_bounds(numbers).sum(axis=0) <= 63
+    # A zero factor makes the product zero, no matter how large the other factors are
+    fits_int64 |= (numbers == 0).any(axis=0)
+    exact_products = [
+        math.prod(map(int, column)) for column in numbers[:, ~fits_int64].T
+    ]
+
+    return numbers[:, fits_int64].prod(axis=0), exact_products
+
+
 def get_grand_totals(addition_numbers: np.ndarray, multiplication_numbers: np.ndarray) -> int:
-    return addition_numbers.sum() + multiplication_numbers.prod(axis=0).sum()
+    int64_products, exact_products = multiply_columns_exactly(multiplication_numbers)
+
+    return sum_exactly(addition_numbers) + sum_exactly(int64_products) + sum(exact_products)
 
 
 if __name__ == "__main__":
@@ -104,3 +280,17 @@ if __name__ == "__main__":
     res = get_grand_totals(numbers_to_add, numbers_to_multiply)
     end = time.perf_counter()
     print(f"Part 2 Result: {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (VECTORIZED)
+    start = time.perf_counter()
+    numbers_to_add, numbers_to_multiply = parse_input_part2_vectorized(in_text)
+    res = get_grand_totals(numbers_to_add, numbers_to_multiply)
+    end = time.perf_counter()
+    print(f"Part 2 Result (vectorized): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 1 AND PART 2 (STREAMED)
+    for part in (1, 2):
+        start = time.perf_counter()
+        res = get_grand_total_streamed("../inputs/06.txt", part)
+        end = time.perf_counter()
+        print(f"Part {part} Result (streamed): {res}. Took {(end - start) * 1000:.2f} ms.")
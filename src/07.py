@@ -1,7 +1,13 @@
+import heapq
 import time
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Iterable
 
 import numpy as np
 
+from grid_loader import build_lookup_table, load_grid, parse_grid
+
 EXAMPLE = """
 .......S.......
 ...............
@@ -28,16 +34,11 @@ CHAR_TO_INT_MAPPING = {
     "^": -1,
 }
 
+CHAR_TO_INT_LOOKUP_TABLE = build_lookup_table(CHAR_TO_INT_MAPPING, dtype=int)
+
 
 def parse_input(text: str) -> np.ndarray:
-    lines = text.strip().split("\n")
-    return np.array(
-        [
-            list(map(lambda char: CHAR_TO_INT_MAPPING[char], list(line.strip())))
-            for line in lines
-        ],
-        dtype=int
-    )
+    return parse_grid(text, CHAR_TO_INT_LOOKUP_TABLE)
 
 
 def simulate_beam(grid: np.ndarray) -> np.ndarray:
@@ -69,6 +70,203 @@ def simulate_beam(grid: np.ndarray) -> np.ndarray:
     return grid
 
 
+def simulate_beam_vectorized(grid: np.ndarray) -> np.ndarray:
+    # Same encoding as in `simulate_beam`, but every row is propagated at once: The beams of the
+    # current row either pass through to the same column of the next row, or they were stopped by
+    # a splitter, which passes them on to the neighboring columns of the next row. Beams that are
+    # split beyond the left or right border of the grid are lost.
+    grid = grid.copy()
+    for i in range(grid.shape[0] - 1):
+        row = grid[i]
+        passing_beams = np.where(row > 0, row, 0)
+        split_beams = np.where(row < -1, -row - 1, 0)
+        incoming_beams = passing_beams
+        incoming_beams[1:] += split_beams[:-1]
+        incoming_beams[:-1] += split_beams[1:]
+        # Empty space cells count the beams, splitters count their hits negatively
+        next_row = grid[i + 1]
+        next_row += np.where(next_row >= 0, incoming_beams, -incoming_beams)
+
+    return grid
+
+
+def build_splitter_index(
+    lines: Iterable[str],
+) -> tuple[list[tuple[int, int]], dict[int, list[int]], int]:
+    """
+    Return the positions of the beam sources, the sorted row indices of the splitters per column
+    (only for columns that contain splitters), and the width of the manifold. The lines are
+    processed one at a time (e.g., directly from a file handle), so the grid is never
+    materialized. Empty lines are skipped.
+
+    """
+    source_positions = []
+    splitter_rows: dict[int, list[int]] = {}
+    width = 0
+    i = 0
+    for line in lines:
+        chars = np.frombuffer(line.strip().encode("ascii"), dtype=np.uint8)
+        if len(chars) == 0:
+            continue
+        for j in np.flatnonzero(chars == ord("^")):
+            splitter_rows.setdefault(int(j), []).append(i)
+        for j in np.flatnonzero(chars == ord("S")):
+            source_positions.append((i, int(j)))
+        width = max(width, len(chars))
+        i += 1
+
+    return source_positions, splitter_rows, width
+
+
+def simulate_beam_sparse(
+    source_positions: list[tuple[int, int]],
+    splitter_rows: dict[int, list[int]],
+    width: int,
+) -> tuple[int, dict[int, int]]:
+    """
+    Sparse counterpart of `simulate_beam` that only keeps track of the active beams. A beam
+    travels straight down, so instead of stepping through every row, we directly jump to the
+    next splitter in its column (or out of the bottom of the manifold). The splitter hits are
+    processed row by row via a heap, merging the beams that hit the same splitter. Path counts are
+    Python ints, so they can't overflow. Return the number of activated splitters and the number
+    of paths per column at the bottom of the manifold (only for columns that are reached).
+
+    """
+    # Beams per splitter position that still have to be split, keyed by row and column
+    pending_hits: dict[int, dict[int, int]] = {}
+    pending_rows: list[int] = []
+    num_paths: dict[int, int] = {}
+
+    def send_beams_down(row: int, col: int, count: int) -> None:
+        rows = splitter_rows.get(col, [])
+        k = bisect_right(rows, row)
+        if k == len(rows):
+            num_paths[col] = num_paths.get(col, 0) + count
+            return
+        if rows[k] not in pending_hits:
+            pending_hits[rows[k]] = {}
+            heapq.heappush(pending_rows, rows[k])
+        hits = pending_hits[rows[k]]
+        hits[col] = hits.get(col, 0) + count
+
+    for row, col in source_positions:
+        send_beams_down(row, col, 1)
+    num_activated_splitters = 0
+    while pending_rows:
+        row = heapq.heappop(pending_rows)
+        hits = pending_hits.pop(row)
+        num_activated_splitters += len(hits)
+        for col, count in hits.items():
+            # Beams that are split beyond the left or right border of the grid are lost
+            for k in (col - 1, col + 1):
+                if 0 <= k < width:
+                    send_beams_down(row, k, count)
+
+    return num_activated_splitters, num_paths
+
+
+def build_transfer_operators(
+    splitter_rows: dict[int, list[int]], start_row: int = 0
+) -> tuple[tuple[int, ...], ...]:
+    """
+    Represent the splitter layout (as returned by `build_splitter_index`) below `start_row` as a
+    chain of sparse transfer operators, one per row that contains splitters. Each operator is
+    given by the sorted splitter columns of its row: It passes the beams of all other columns
+    through and sends the beams that hit a splitter to the neighboring columns. Rows without
+    splitters are the identity, so they are left out. The chain is a tuple of tuples, so it can
+    be used as a cache key.
+
+    """
+    splitter_columns_per_row: dict[int, list[int]] = {}
+    for col, rows in splitter_rows.items():
+        for row in rows:
+            if row > start_row:
+                splitter_columns_per_row.setdefault(row, []).append(col)
+
+    return tuple(
+        tuple(sorted(splitter_columns_per_row[row])) for row in sorted(splitter_columns_per_row)
+    )
+
+
+def propagate_beams(
+    beams: np.ndarray, transfer_operators: tuple[tuple[int, ...], ...]
+) -> np.ndarray:
+    # Propagate a whole batch of beam vectors (shape (num_starts, width)) through the chain of
+    # transfer operators at once
+    beams = beams.copy()
+    width = beams.shape[1]
+    for splitter_columns in transfer_operators:
+        splitter_columns = np.array(splitter_columns, dtype=np.intp)
+        split_beams = beams[:, splitter_columns]
+        beams[:, splitter_columns] = 0
+        # Beams that are split beyond the left or right border of the grid are lost
+        for offset in (-1, 1):
+            target_columns = splitter_columns + offset
+            is_inside = (target_columns >= 0) & (target_columns < width)
+            beams[:, target_columns[is_inside]] += split_beams[:, is_inside]
+
+    return beams
+
+
+# Composed transfer operators of the most recently used layouts (see
+# `get_composed_transfer_operator`). Each one takes 8 * width^2 bytes, so only a few are kept.
+MAX_NUM_CACHED_OPERATORS = 4
+composed_transfer_operators_cache: OrderedDict[
+    tuple[tuple[tuple[int, ...], ...], int, bool], np.ndarray
+] = OrderedDict()
+
+
+def get_composed_transfer_operator(
+    transfer_operators: tuple[tuple[int, ...], ...], width: int, exact: bool = False
+) -> np.ndarray:
+    """
+    Compose the chain of transfer operators into a single (width, width) matrix, whose row `j`
+    holds the number of paths per bottom column for a beam that starts in column `j`. The result
+    is cached for the `MAX_NUM_CACHED_OPERATORS` most recently used layouts, so repeated queries
+    don't propagate any beams. If `exact` is True, the path counts are Python ints, which can't
+    overflow (but are much slower to compute).
+
+    """
+    key = (transfer_operators, width, exact)
+    if key in composed_transfer_operators_cache:
+        composed_transfer_operators_cache.move_to_end(key)
+        return composed_transfer_operators_cache[key]
+
+    identity = np.eye(width, dtype=object if exact else np.int64)
+    composed_operator = propagate_beams(identity, transfer_operators)
+    # The cached matrix is shared between all callers
+    composed_operator.flags.writeable = False
+    composed_transfer_operators_cache[key] = composed_operator
+    if len(composed_transfer_operators_cache) > MAX_NUM_CACHED_OPERATORS:
+        composed_transfer_operators_cache.popitem(last=False)
+
+    return composed_operator
+
+
+def count_num_paths_per_start_column(
+    splitter_rows: dict[int, list[int]],
+    width: int,
+    start_columns: list[int] | None = None,
+    start_row: int = 0,
+    exact: bool = False,
+) -> np.ndarray:
+    # Number of paths per bottom column for every start column, i.e., an array of shape
+    # (num_starts, width). By default, every column of `start_row` is a start column, and the
+    # composed operator is built (and cached). For a few start columns, only their beams are
+    # propagated, unless the layout's composed operator is cached already.
+    transfer_operators = build_transfer_operators(splitter_rows, start_row)
+    if start_columns is None:
+        return get_composed_transfer_operator(transfer_operators, width, exact)
+    key = (transfer_operators, width, exact)
+    if key in composed_transfer_operators_cache:
+        return get_composed_transfer_operator(*key)[start_columns]
+
+    start_beams = np.zeros((len(start_columns), width), dtype=object if exact else np.int64)
+    start_beams[np.arange(len(start_columns)), start_columns] = 1
+
+    return propagate_beams(start_beams, transfer_operators)
+
+
 def count_num_activated_splitters(grid: np.ndarray) -> int:
     return (grid < -1).sum()
 
@@ -78,12 +276,9 @@ def count_num_paths(grid: np.ndarray) -> int:
 
 
 if __name__ == "__main__":
-    with open("../inputs/07.txt", "r") as fh:
-        in_text = fh.read()
-
     # PART 1
     start = time.perf_counter()
-    beam_grid = simulate_beam(parse_input(in_text))
+    beam_grid = simulate_beam(load_grid("../inputs/07.txt", CHAR_TO_INT_LOOKUP_TABLE))
     res = count_num_activated_splitters(beam_grid)
     end = time.perf_counter()
     print(f"Part 1 Result: {res}. Took {(end - start) * 1000:.2f} ms.")
@@ -93,3 +288,37 @@ if __name__ == "__main__":
     res = count_num_paths(beam_grid)
     end = time.perf_counter()
     print(f"Part 2 Result: {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 1 (VECTORIZED)
+    start = time.perf_counter()
+    beam_grid = simulate_beam_vectorized(load_grid("../inputs/07.txt", CHAR_TO_INT_LOOKUP_TABLE))
+    res = count_num_activated_splitters(beam_grid)
+    end = time.perf_counter()
+    print(f"Part 1 Result (vectorized): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (VECTORIZED)
+    start = time.perf_counter()
+    res = count_num_paths(beam_grid)
+    end = time.perf_counter()
+    print(f"Part 2 Result (vectorized): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 1 AND PART 2 (SPARSE)
+    start = time.perf_counter()
+    with open("../inputs/07.txt", "r") as fh:
+        res, bottom_num_paths = simulate_beam_sparse(*build_splitter_index(fh))
+    end = time.perf_counter()
+    print(f"Part 1 Result (sparse): {res}. Took {(end - start) * 1000:.2f} ms.")
+    print(f"Part 2 Result (sparse): {sum(bottom_num_paths.values())}.")
+
+    # PART 2 FOR ALL START COLUMNS (TRANSFER MATRIX)
+    start = time.perf_counter()
+    with open("../inputs/07.txt", "r") as fh:
+        (source_position, *_), manifold_splitter_rows, manifold_width = build_splitter_index(fh)
+    num_paths_per_start_column = count_num_paths_per_start_column(
+        manifold_splitter_rows, manifold_width, start_row=source_position[0]
+    ).sum(axis=1)
+    end = time.perf_counter()
+    print(
+        f"Part 2 Result (transfer matrix): {num_paths_per_start_column[source_position[1]]}. "
+        f"Took {(end - start) * 1000:.2f} ms."
+    )
@@ -1,7 +1,11 @@
+import heapq
+import itertools
 import math
 import time
+from typing import Iterable, Iterator
 
 import numpy as np
+from scipy.spatial import cKDTree
 
 EXAMPLE = """
 162,817,812
@@ -43,6 +47,164 @@ def build_distance_map(points: list[np.ndarray]) -> np.ndarray:
     return distance_map
 
 
+def build_condensed_distance_map(
+    points: np.ndarray | list[np.ndarray], max_block_size: int = 1 << 22
+) -> np.ndarray:
+    """
+    Vectorized counterpart of `build_distance_map`. Return the exact squared distances of all
+    point pairs (i, j) with j < i as a condensed int64 array, i.e., the lower triangle of the
+    distance map in row-major order: The distance of (i, j) is found at index i * (i - 1) // 2 + j.
+    Since the square root is monotonic, squared distances preserve the order of the distances.
+    The points are processed in blocks of rows, so that the temporary coordinate differences of a
+    block (three per pair) don't exceed roughly `max_block_size` elements.
+
+    """
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 3)
+    n = len(points)
+    distances = np.empty(n * (n - 1) // 2, dtype=np.int64)
+    max_num_pairs = max(1, max_block_size // 3)
+    block_start = 1
+    while block_start < n:
+        # A block of r rows starting at row s is paired with s + r - 1 columns. Solve
+        # r * (s + r - 1) <= max_num_pairs for r.
+        num_rows = (
+            math.isqrt((block_start - 1) ** 2 + 4 * max_num_pairs) - (block_start - 1)
+        ) // 2
+        block_end = min(n, block_start + max(1, num_rows))
+        diffs = points[block_start:block_end, None, :] - points[None, :block_end - 1, :]
+        block_distances = (diffs * diffs).sum(axis=2)
+        # Keep only the pairs with j < i. Since the rows of the block are consecutive, their
+        # condensed entries are consecutive as well.
+        i_idcs, j_idcs = np.tril_indices(
+            block_end - block_start, k=block_start - 1, m=block_end - 1
+        )
+        distances[block_start * (block_start - 1) // 2:block_end * (block_end - 1) // 2] = (
+            block_distances[i_idcs, j_idcs]
+        )
+        block_start = block_end
+
+    return distances
+
+
+def get_idx_pairs_from_condensed_idcs(condensed_idcs: np.ndarray) -> np.ndarray:
+    # Invert i * (i - 1) // 2 + j = k for j < i. The float estimate of i is corrected, in case it
+    # is off by one due to rounding.
+    condensed_idcs = np.asarray(condensed_idcs, dtype=np.int64)
+    i_idcs = ((1 + np.sqrt(1 + 8 * condensed_idcs.astype(float))) // 2).astype(np.int64)
+    i_idcs -= i_idcs * (i_idcs - 1) // 2 > condensed_idcs
+    i_idcs += (i_idcs + 1) * i_idcs // 2 <= condensed_idcs
+    j_idcs = condensed_idcs - i_idcs * (i_idcs - 1) // 2
+
+    return np.stack([i_idcs, j_idcs], axis=1)
+
+
+def get_num_nodes(distance_map: np.ndarray) -> int:
+    if distance_map.ndim == 2:
+        return distance_map.shape[0]
+    # The condensed distance map has n * (n - 1) / 2 entries
+    return int(round((1 + math.sqrt(1 + 8 * len(distance_map))) / 2))
+
+
+class DisjointSetUnion:
+    """
+    Disjoint-set union (union-find) over the nodes 0, ..., n - 1 with path compression and union
+    by size. The number of components and the size of each component are kept up to date with
+    every union.
+
+    """
+
+    def __init__(self, n: int) -> None:
+        self.parents = list(range(n))
+        self.sizes = [1] * n
+        self.num_components = n
+
+    def find(self, node: int) -> int:
+        root = node
+        while self.parents[root] != root:
+            root = self.parents[root]
+        # Path compression: Let all nodes on the path point directly to the root
+        while self.parents[node] != root:
+            self.parents[node], node = root, self.parents[node]
+
+        return root
+
+    def union(self, node1: int, node2: int) -> bool:
+        # Return whether the nodes were in different components before
+        root1 = self.find(node1)
+        root2 = self.find(node2)
+        if root1 == root2:
+            return False
+        if self.sizes[root1] < self.sizes[root2]:
+            root1, root2 = root2, root1
+        self.parents[root2] = root1
+        self.sizes[root1] += self.sizes[root2]
+        self.num_components -= 1
+
+        return True
+
+    def add_node(self) -> int:
+        # Add a new node in a component of its own and return its index
+        self.parents.append(len(self.parents))
+        self.sizes.append(1)
+        self.num_components += 1
+
+        return len(self.parents) - 1
+
+    def get_clusters(self) -> list[set]:
+        # Components with at least two nodes, i.e., nodes without any connection are left out
+        clusters: dict[int, set] = {}
+        for node in range(len(self.parents)):
+            clusters.setdefault(self.find(node), set()).add(node)
+
+        return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+
+def select_shortest(distances: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Partial sort: Return the positions of the `k` smallest `distances`, sorted like a stable
+    argsort would sort them (i.e., ties broken by position), together with a mask of the positions
+    that were not selected. Instead of sorting all distances, `np.partition` finds the k-th
+    smallest distance in linear time, and only the `k` selected distances are sorted.
+
+    """
+    is_remaining = np.ones(len(distances), dtype=bool)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), is_remaining
+    if k >= len(distances):
+        return np.argsort(distances, kind="stable"), ~is_remaining
+    max_distance = np.partition(distances, k - 1)[k - 1]
+    is_selected = distances < max_distance
+    # Among the distances that are equal to the k-th smallest one, take those at the front
+    num_missing = k - np.count_nonzero(is_selected)
+    is_selected[np.flatnonzero(distances == max_distance)[:num_missing]] = True
+    positions = np.flatnonzero(is_selected)
+    is_remaining[positions] = False
+
+    return positions[np.argsort(distances[positions], kind="stable")], is_remaining
+
+
+def iter_sorted_condensed_idcs(
+    distances: np.ndarray, initial_batch_size: int = 1 << 12, growth_factor: int = 4
+) -> Iterator[np.ndarray]:
+    """
+    Lazily yield the indices of the condensed `distances` in the order of a stable argsort, in
+    batches that grow by `growth_factor`. Every batch is selected via `select_shortest` from the
+    distances that were not yielded yet, so if the consumer stops early, most of the distances
+    are never sorted. Thanks to the geometric growth, the number of passes over the remaining
+    distances is only logarithmic.
+
+    """
+    remaining_idcs = np.arange(len(distances))
+    remaining_distances = distances
+    batch_size = initial_batch_size
+    while len(remaining_idcs) > 0:
+        positions, is_remaining = select_shortest(remaining_distances, batch_size)
+        yield remaining_idcs[positions]
+        remaining_idcs = remaining_idcs[is_remaining]
+        remaining_distances = remaining_distances[is_remaining]
+        batch_size *= growth_factor
+
+
 def connect_junctions(
     distance_map: np.ndarray,
     num_connections: int | None = None,
@@ -60,44 +222,612 @@ def connect_junctions(
     nodes.
 
     """
-    idx_pairs_sorted = np.stack(
-        np.unravel_index(distance_map.ravel().argsort(), distance_map.shape)
-    ).T
-    n_pairs = distance_map.shape[0] * (distance_map.shape[0] - 1) // 2
+    n_nodes = get_num_nodes(distance_map)
+    n_pairs = n_nodes * (n_nodes - 1) // 2
+    if distance_map.ndim == 2:
+        # Only the lower triangle holds actual distances. Extracting it in row-major order yields
+        # the layout of the condensed distance map.
+        distance_map = distance_map[np.tril_indices(n_nodes, k=-1)]
     if num_connections is None:
-        idx_pairs_sorted = idx_pairs_sorted[:n_pairs]
+        # Typically, the last cluster-connecting edge comes long before the longest edge
+        idx_pair_batches = map(
+            get_idx_pairs_from_condensed_idcs, iter_sorted_condensed_idcs(distance_map)
+        )
     else:
         if num_connections > n_pairs:
             raise ValueError(
                 f"`num_connections` is too large. Maximum possible value is {n_pairs}."
             )
-        idx_pairs_sorted = idx_pairs_sorted[:num_connections]
-    clusters = []
-    for idx1, idx2 in idx_pairs_sorted:
-        hit = -1
-        for i, cluster in enumerate(clusters):
-            if idx1 in cluster or idx2 in cluster:
-                if hit == -1:
-                    cluster.update((idx1, idx2))
-                    hit = i
-                elif hit != i:
-                    # Other point of the idx tuple is already in another cluster
-                    # -> Connect these two clusters
-                    cluster.update((idx1, idx2))
-                    cluster.update(clusters[hit])
-                    del clusters[hit]
-            if len(clusters) == 1 and clusters[0] == set(range(distance_map.shape[0])):
+        idx_pair_batches = [
+            get_idx_pairs_from_condensed_idcs(select_shortest(distance_map, num_connections)[0])
+        ]
+    return connect_sorted_idx_pairs(idx_pair_batches, n_nodes)
+
+
+def connect_sorted_idx_pairs(
+    idx_pairs_sorted: np.ndarray | Iterable[np.ndarray], n_nodes: int
+) -> tuple[list[set], tuple[int, int] | None]:
+    # Connect the node pairs in the given order, which are either given as one (n, 2) array or as
+    # consecutive batches of such arrays. See `connect_junctions` for the returned tuple.
+    if isinstance(idx_pairs_sorted, np.ndarray):
+        idx_pairs_sorted = [idx_pairs_sorted]
+    dsu = DisjointSetUnion(n_nodes)
+    for idx_pairs in idx_pairs_sorted:
+        for idx1, idx2 in idx_pairs.tolist():
+            if dsu.union(idx1, idx2) and dsu.num_components == 1:
                 # There is only one cluster left that contains all nodes. We abort here, since
                 # adding additional connections can't change the cluster anymore.
-                return clusters, (idx1, idx2)
-        if hit == -1:
-            clusters.append({idx1, idx2})
+                return [set(range(n_nodes))], (idx1, idx2)
+
+    return dsu.get_clusters(), None
+
+
+MAX_SQUARED_DISTANCE = np.iinfo(np.int64).max
+
+
+def get_squared_distances(points1: np.ndarray, points2: np.ndarray) -> np.ndarray:
+    diffs = points1 - points2
+
+    return (diffs * diffs).sum(axis=-1)
+
+
+def get_search_radii(squared_distances: np.ndarray) -> np.ndarray:
+    # The k-d tree works on floats. Enlarge the radii slightly, so that no point at exactly the
+    # given squared distance is missed, and filter by the exact squared distances afterwards.
+    squared_distances = np.asarray(squared_distances)
+    return np.where(
+        squared_distances == MAX_SQUARED_DISTANCE,
+        np.inf,
+        np.sqrt(squared_distances.astype(float)) * (1 + 1e-9) + 1e-9,
+    )
+
+
+def get_tie_ranks(point_idcs: np.ndarray, neighbor_idcs: np.ndarray, n: int) -> np.ndarray:
+    # Among the neighbors of a point at the same distance, the one with the smallest rank forms
+    # the edge that comes first in the order of `sort_idx_pairs`, i.e., the edge with the smallest
+    # (larger index, smaller index). Neighbors with a smaller index than the point come first.
+    return neighbor_idcs + (neighbor_idcs > point_idcs) * n
+
+
+def sort_idx_pairs(
+    idcs1: np.ndarray, idcs2: np.ndarray, squared_distances: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the unique node pairs as (n, 2) array with the larger index first (like the lower
+    triangle of the distance map) together with their squared distances, both sorted by distance.
+    Ties are broken by the node indices, like in the condensed distance map.
+
+    """
+    idx_pairs = np.stack([np.maximum(idcs1, idcs2), np.minimum(idcs1, idcs2)], axis=1)
+    idx_pairs, unique_idcs = np.unique(idx_pairs, axis=0, return_index=True)
+    squared_distances = squared_distances[unique_idcs]
+    order = np.lexsort((idx_pairs[:, 1], idx_pairs[:, 0], squared_distances))
+
+    return idx_pairs[order], squared_distances[order]
+
+
+def iter_ball_pairs(
+    tree: cKDTree,
+    query_points: np.ndarray,
+    radii: float | np.ndarray,
+    max_block_size: int = 1 << 22,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield all pairs (position of query point, position of tree point) within the given radii.
+    The pairs per query point are counted first, so that the query points can be processed in
+    batches whose coordinate differences (three per pair) don't exceed roughly `max_block_size`
+    elements.
+
+    """
+    max_num_pairs = max(1, max_block_size // 3)
+    radii = np.broadcast_to(radii, len(query_points))
+    cum_counts = np.cumsum(tree.query_ball_point(query_points, radii, return_length=True))
+    batch_start = 0
+    while batch_start < len(query_points):
+        num_previous_pairs = cum_counts[batch_start - 1] if batch_start > 0 else 0
+        batch_end = max(
+            batch_start + 1,
+            int(np.searchsorted(cum_counts, num_previous_pairs + max_num_pairs, side="right")),
+        )
+        neighbor_lists = tree.query_ball_point(
+            query_points[batch_start:batch_end], radii[batch_start:batch_end]
+        )
+        counts = np.diff(cum_counts[batch_start:batch_end], prepend=num_previous_pairs)
+        neighbor_positions = np.fromiter(
+            itertools.chain.from_iterable(neighbor_lists), dtype=np.int64, count=int(counts.sum())
+        )
+        yield np.repeat(np.arange(batch_start, batch_end), counts), neighbor_positions
+        batch_start = batch_end
+
+
+def get_k_nearest_neighbors(
+    points: np.ndarray, tree: cKDTree, k: int, max_block_size: int = 1 << 22
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the indices of the `k` nearest other points of every point and their exact squared
+    distances, both of shape (n, k) and sorted by distance. The points are queried in batches,
+    the coordinate differences of which don't exceed roughly `max_block_size` elements.
+
+    """
+    n = len(points)
+    neighbor_idcs = np.empty((n, k), dtype=np.int64)
+    neighbor_distances = np.empty((n, k), dtype=np.int64)
+    batch_size = max(1, max_block_size // (3 * (k + 1)))
+    for batch_start in range(0, n, batch_size):
+        batch = np.arange(batch_start, min(n, batch_start + batch_size))
+        _, idcs = tree.query(points[batch], k + 1)
+        # Drop the point itself. If it has more than k duplicates, it may be missing from its own
+        # list, in which case we drop the last neighbor instead.
+        is_self = idcs == batch[:, None]
+        is_self[~is_self.any(axis=1), -1] = True
+        idcs = idcs[~is_self].reshape(-1, k)
+        squared_distances = get_squared_distances(points[batch, None, :], points[idcs])
+        order = np.argsort(squared_distances, axis=1, kind="stable")
+        neighbor_idcs[batch] = np.take_along_axis(idcs, order, axis=1)
+        neighbor_distances[batch] = np.take_along_axis(squared_distances, order, axis=1)
+
+    return neighbor_idcs, neighbor_distances
+
+
+def get_nearest_foreign_neighbors(
+    points: np.ndarray,
+    point_idcs: np.ndarray,
+    component_ids: np.ndarray,
+    max_squared_distances: np.ndarray,
+    max_block_size: int = 1 << 22,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the nearest point of another component for each of the given points, if it is at most
+    `max_squared_distances` away. The components are given as ids 0, ..., c - 1. Two different
+    components differ in at least one bit of their ids, so for every bit, we search the points
+    whose bit differs from the query point's one in a k-d tree. That way, the points of the own
+    component are never visited. Ties are broken by `get_tie_ranks`. Return the nearest foreign
+    points (-1 if not found) and their squared distances.
+
+    """
+    n = len(points)
+    nearest_idcs = np.full(len(point_idcs), -1, dtype=np.int64)
+    nearest_distances = np.full(len(point_idcs), MAX_SQUARED_DISTANCE, dtype=np.int64)
+    for bit in range(max(1, int(component_ids.max()).bit_length())):
+        sides = (component_ids >> bit) & 1
+        for side in (0, 1):
+            positions = np.flatnonzero(sides[point_idcs] == side)
+            tree_idcs = np.flatnonzero(sides != side)
+            if len(positions) == 0 or len(tree_idcs) == 0:
+                continue
+            tree = cKDTree(points[tree_idcs])
+            query_idcs = point_idcs[positions]
+            max_distances = np.minimum(
+                max_squared_distances[positions], nearest_distances[positions]
+            )
+            _, found = tree.query(
+                points[query_idcs],
+                min(2, len(tree_idcs)),
+                distance_upper_bound=float(get_search_radii(max_distances.max())),
+            )
+            found = found.reshape(len(positions), -1)
+            # Missing neighbors are reported as len(tree_idcs)
+            found_idcs = np.append(tree_idcs, -1)[found]
+            found_distances = np.where(
+                found_idcs >= 0,
+                get_squared_distances(points[query_idcs, None, :], points[found_idcs]),
+                MAX_SQUARED_DISTANCE,
+            )
+            candidate_idcs = found_idcs[:, 0]
+            candidate_distances = found_distances[:, 0]
+
+            # If the second neighbor is just as close, all neighbors at that distance compete
+            is_tie = (candidate_idcs >= 0) & (found_distances[:, -1] == candidate_distances)
+            tie_positions = np.flatnonzero(is_tie)
+            tie_ranks = np.full(len(positions), 2 * n, dtype=np.int64)
+            for query_positions, tree_positions in iter_ball_pairs(
+                tree,
+                points[query_idcs[tie_positions]],
+                get_search_radii(candidate_distances[tie_positions]),
+                max_block_size,
+            ):
+                query_positions = tie_positions[query_positions]
+                tie_idcs = tree_idcs[tree_positions]
+                is_nearest = (
+                    get_squared_distances(points[query_idcs[query_positions]], points[tie_idcs])
+                    == candidate_distances[query_positions]
+                )
+                np.minimum.at(
+                    tie_ranks,
+                    query_positions[is_nearest],
+                    get_tie_ranks(query_idcs[query_positions], tie_idcs, n)[is_nearest],
+                )
+            tie_ranks = tie_ranks[tie_positions]
+            candidate_idcs[tie_positions] = tie_ranks - (tie_ranks >= n) * n
+
+            is_better = (candidate_distances <= max_distances) & (
+                (candidate_distances < nearest_distances[positions])
+                | (
+                    (candidate_distances == nearest_distances[positions])
+                    & (
+                        get_tie_ranks(query_idcs, candidate_idcs, n)
+                        < get_tie_ranks(query_idcs, nearest_idcs[positions], n)
+                    )
+                )
+            )
+            nearest_idcs[positions[is_better]] = candidate_idcs[is_better]
+            nearest_distances[positions[is_better]] = candidate_distances[is_better]
 
-    return clusters, None
+    return nearest_idcs, nearest_distances
+
+
+def get_minimum_spanning_tree(
+    points: np.ndarray, k: int = 8, max_block_size: int = 1 << 22
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Euclidean minimum spanning tree via Borůvka's algorithm. Every round, each component is
+    connected to its nearest other component. Edges are compared as (squared distance, larger
+    index, smaller index), so the tree is unique and the same that `connect_junctions` builds.
+    The nearest foreign point of a point is taken from its list of k nearest neighbors. Only if
+    the list doesn't settle it (no foreign point in the list, or a tie with the k-th neighbor),
+    and if the point could still beat its component's best edge, we fall back to
+    `get_nearest_foreign_neighbors`. Return the tree's edges in the same format and order as
+    `sort_idx_pairs`.
+
+    """
+    _, first_idcs, site_ids = np.unique(points, axis=0, return_index=True, return_inverse=True)
+    if len(first_idcs) < len(points):
+        # Every duplicate is connected to the first occurrence of its point. Between two groups
+        # of duplicates, the first edge is the one between their first occurrences, so the rest
+        # of the tree is the tree of the first occurrences (kept in the order of their indices).
+        site_ids = site_ids.ravel()
+        duplicate_idcs = np.flatnonzero(first_idcs[site_ids] != np.arange(len(points)))
+        duplicate_first_idcs = first_idcs[site_ids[duplicate_idcs]]
+        first_idcs = np.sort(first_idcs)
+        site_pairs, site_distances = get_minimum_spanning_tree(
+            points[first_idcs], k, max_block_size
+        )
+        return sort_idx_pairs(
+            np.concatenate([duplicate_idcs, first_idcs[site_pairs[:, 0]]]),
+            np.concatenate([duplicate_first_idcs, first_idcs[site_pairs[:, 1]]]),
+            np.concatenate([np.zeros(len(duplicate_idcs), dtype=np.int64), site_distances]),
+        )
+
+    n = len(points)
+    if n < 2:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    k = min(k, n - 1)
+    neighbor_idcs, neighbor_distances = get_k_nearest_neighbors(
+        points, cKDTree(points), k, max_block_size
+    )
+    point_idcs = np.arange(n)
+    neighbor_ranks = get_tie_ranks(point_idcs[:, None], neighbor_idcs, n)
+    component_ids = np.arange(n)
+    num_components = n
+    edges1, edges2, edge_distances = [], [], []
+    while num_components > 1:
+        is_foreign = component_ids[neighbor_idcs] != component_ids[:, None]
+        has_foreign = is_foreign.any(axis=1)
+        nearest_distances = np.where(
+            has_foreign,
+            neighbor_distances[point_idcs, is_foreign.argmax(axis=1)],
+            MAX_SQUARED_DISTANCE,
+        )
+        is_nearest = is_foreign & (neighbor_distances == nearest_distances[:, None])
+        nearest_columns = np.where(is_nearest, neighbor_ranks, 2 * n).argmin(axis=1)
+        nearest_idcs = np.where(has_foreign, neighbor_idcs[point_idcs, nearest_columns], -1)
+        best_distances = np.full(num_components, MAX_SQUARED_DISTANCE, dtype=np.int64)
+        np.minimum.at(best_distances, component_ids, nearest_distances)
+
+        # Foreign points that are not among the k nearest neighbors are at least as far away as
+        # the k-th nearest neighbor
+        if k < n - 1:
+            search_idcs = np.flatnonzero(
+                (nearest_distances >= neighbor_distances[:, -1])
+                & (neighbor_distances[:, -1] <= best_distances[component_ids])
+            )
+            found_idcs, found_distances = get_nearest_foreign_neighbors(
+                points,
+                search_idcs,
+                component_ids,
+                best_distances[component_ids[search_idcs]],
+                max_block_size,
+            )
+            is_found = found_idcs >= 0
+            nearest_idcs[search_idcs[is_found]] = found_idcs[is_found]
+            nearest_distances[search_idcs[is_found]] = found_distances[is_found]
+
+        # Pick the first edge per component
+        candidates = np.flatnonzero(nearest_idcs >= 0)
+        larger_idcs = np.maximum(candidates, nearest_idcs[candidates])
+        smaller_idcs = np.minimum(candidates, nearest_idcs[candidates])
+        order = np.lexsort(
+            (smaller_idcs, larger_idcs, nearest_distances[candidates], component_ids[candidates])
+        )
+        is_first = np.ones(len(order), dtype=bool)
+        is_first[1:] = component_ids[candidates][order][1:] != component_ids[candidates][order][:-1]
+        picked = candidates[order[is_first]]
+
+        # Merge the components along the picked edges (each edge is usually picked twice)
+        dsu = DisjointSetUnion(num_components)
+        for idx1, idx2, squared_distance in zip(
+            picked.tolist(), nearest_idcs[picked].tolist(), nearest_distances[picked].tolist()
+        ):
+            if dsu.union(int(component_ids[idx1]), int(component_ids[idx2])):
+                edges1.append(idx1)
+                edges2.append(idx2)
+                edge_distances.append(squared_distance)
+        roots = np.array([dsu.find(component_id) for component_id in range(num_components)])
+        _, component_ids = np.unique(roots[component_ids], return_inverse=True)
+        num_components = dsu.num_components
+
+    return sort_idx_pairs(
+        np.array(edges1, dtype=np.int64),
+        np.array(edges2, dtype=np.int64),
+        np.array(edge_distances, dtype=np.int64),
+    )
+
+
+def iter_pairs_within(
+    points: np.ndarray,
+    point_idcs: np.ndarray,
+    max_squared_distance: int,
+    max_block_size: int = 1 << 22,
+) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Yield all pairs among the given points that are at most `max_squared_distance` apart as
+    batches of (larger indices, smaller indices, squared distances), see `iter_ball_pairs`.
+
+    """
+    if len(point_idcs) < 2:
+        return
+    query_points = points[point_idcs]
+    tree = cKDTree(query_points)
+    radius = float(get_search_radii(max_squared_distance))
+    for positions1, positions2 in iter_ball_pairs(tree, query_points, radius, max_block_size):
+        idcs1 = point_idcs[positions1]
+        idcs2 = point_idcs[positions2]
+        squared_distances = get_squared_distances(points[idcs1], points[idcs2])
+        is_selected = (idcs2 < idcs1) & (squared_distances <= max_squared_distance)
+        yield idcs1[is_selected], idcs2[is_selected], squared_distances[is_selected]
+
+
+def get_shortest_idx_pairs(
+    points: np.ndarray, num_pairs: int, k: int = 8, max_block_size: int = 1 << 22
+) -> np.ndarray:
+    """
+    Return the `num_pairs` closest node pairs in the same format and order as `sort_idx_pairs`.
+    The candidate pairs are the kNN edges, with k large enough that there are at least
+    `num_pairs` of them. A pair that is missing from the candidates is farther apart than the
+    k-th nearest neighbor of both its nodes. So, only among the points whose k-th nearest
+    neighbor is not farther than the `num_pairs`-th candidate, we add all pairs within that
+    distance, batch by batch.
+
+    """
+    n = len(points)
+    k = min(n - 1, max(k, math.ceil(2 * num_pairs / n)))
+    neighbor_idcs, neighbor_distances = get_k_nearest_neighbors(
+        points, cKDTree(points), k, max_block_size
+    )
+    idx_pairs, squared_distances = sort_idx_pairs(
+        np.repeat(np.arange(n), k), neighbor_idcs.ravel(), neighbor_distances.ravel()
+    )
+    idx_pairs, squared_distances = idx_pairs[:num_pairs], squared_distances[:num_pairs]
+    max_squared_distance = int(squared_distances[-1])
+    search_idcs = np.flatnonzero(neighbor_distances[:, -1] <= max_squared_distance)
+    for idcs1, idcs2, search_squared_distances in iter_pairs_within(
+        points, search_idcs, max_squared_distance, max_block_size
+    ):
+        idx_pairs, squared_distances = sort_idx_pairs(
+            np.concatenate([idx_pairs[:, 0], idcs1]),
+            np.concatenate([idx_pairs[:, 1], idcs2]),
+            np.concatenate([squared_distances, search_squared_distances]),
+        )
+        idx_pairs, squared_distances = idx_pairs[:num_pairs], squared_distances[:num_pairs]
+
+    return idx_pairs
+
+
+def connect_junctions_spatial(
+    points: np.ndarray | list[np.ndarray],
+    num_connections: int | None = None,
+    k: int = 8,
+    max_block_size: int = 1 << 22,
+) -> tuple[list[set], tuple[int, int] | None]:
+    """
+    Scalable counterpart of `connect_junctions` that works on the points directly and needs
+    neither the distance map nor a sort of all pairs. If `num_connections` is given, only the
+    `num_connections` closest pairs are found via a k-d tree. Otherwise, the clusters only
+    change along the edges of the minimum spanning tree, so the last cluster-connecting edge is
+    found by connecting the tree's edges in order of their lengths. Like in
+    `build_condensed_distance_map`, the points are processed in blocks, so that temporary
+    coordinate differences don't exceed roughly `max_block_size` elements.
+
+    """
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 3)
+    n_nodes = len(points)
+    n_pairs = n_nodes * (n_nodes - 1) // 2
+    if num_connections is not None and num_connections > n_pairs:
+        raise ValueError(f"`num_connections` is too large. Maximum possible value is {n_pairs}.")
+    if n_nodes < 2 or num_connections == 0:
+        return [], None
+    if num_connections is None:
+        idx_pairs_sorted, _ = get_minimum_spanning_tree(points, k, max_block_size)
+    else:
+        idx_pairs_sorted = get_shortest_idx_pairs(points, num_connections, k, max_block_size)
+
+    return connect_sorted_idx_pairs(idx_pairs_sorted, n_nodes)
+
+
+class OnlineJunctionClustering:
+    """
+    Clustering that is updated with every inserted junction box instead of being recomputed from
+    scratch. We keep the minimum spanning forest of the graph that connects all junction boxes
+    closer than `max_squared_distance` (all junction boxes if None), since the clusters of
+    `connect_junctions` only change along the edges of that forest. When a junction box is
+    inserted, only its own edges are new, and the new forest consists of the old one plus these
+    edges, minus the longest edge of every cycle (see `update_tree`).
+    The candidate edges are found in a hash grid with cells of the cut-off distance, so with a
+    cut-off, an insertion only touches the junction boxes nearby and the trees they belong to.
+    Without one, every junction box is a candidate.
+
+    """
+
+    def __init__(self, max_squared_distance: int | None = None) -> None:
+        self.max_squared_distance = max_squared_distance
+        self.cell_size = None
+        if max_squared_distance is not None:
+            self.cell_size = max(1, math.isqrt(max_squared_distance))
+        self.cells: dict[tuple[int, ...], list[int]] = {}
+        self.points = np.zeros((16, 3), dtype=np.int64)
+        self.num_points = 0
+        # Forest as adjacency lists with the squared edge lengths, and its components
+        self.adjacency: list[dict[int, int]] = []
+        self.dsu = DisjointSetUnion(0)
+        # Max-heap of all edges ever added. Removed edges are skipped lazily.
+        self.edge_heap: list[tuple[int, int, int]] = []
+
+    def __len__(self) -> int:
+        return self.num_points
+
+    def get_cell(self, point: np.ndarray) -> tuple[int, ...]:
+        return tuple((point // self.cell_size).tolist())
+
+    def get_candidates(self, point: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Existing junction boxes within the cut-off distance and their squared distances
+        if self.cell_size is None:
+            candidate_idcs = np.arange(self.num_points)
+        else:
+            cell = self.get_cell(point)
+            candidate_idcs = np.array(
+                [
+                    idx
+                    for offset in itertools.product((-1, 0, 1), repeat=3)
+                    for idx in self.cells.get(tuple(c + o for c, o in zip(cell, offset)), [])
+                ],
+                dtype=np.int64,
+            )
+        squared_distances = get_squared_distances(self.points[candidate_idcs], point)
+        if self.max_squared_distance is None:
+            return candidate_idcs, squared_distances
+        is_close = squared_distances <= self.max_squared_distance
+
+        return candidate_idcs[is_close], squared_distances[is_close]
+
+    def update_tree(
+        self, new_idx: int, root: int, squared_distances: dict[int, int]
+    ) -> tuple[list[tuple[int, int, int]], list[tuple[int, int, int]]]:
+        """
+        Update the tree that contains `root` for the new node's edges with the given squared
+        lengths (Chin and Houck's vertex insertion). The tree is processed bottom-up. For every
+        node v, we track m(v), the longest edge on the path from v to the new node within the
+        new tree of v's subtree. Every child c of v closes a cycle with the edges (c, v), m(c) and
+        m(v), from which the longest edge is dropped. Of the remaining two, the shorter one is
+        kept for good, and the longer one becomes m(v). Edges are compared as (squared length,
+        larger node, smaller node), i.e., in the order of `connect_junctions`.
+        Return the edges to add (new ones) and to remove (old ones).
+
+        """
+        no_edge = MAX_SQUARED_DISTANCE
+        parents = {root: root}
+        nodes = [root]
+        for node in nodes:
+            for neighbor in self.adjacency[node]:
+                if neighbor not in parents:
+                    parents[neighbor] = node
+                    nodes.append(neighbor)
+        longest_edges = {
+            node: (squared_distances.get(node, no_edge), new_idx, node) for node in nodes
+        }
+        kept_edges = []
+        dropped_edges = []
+        # In reverse breadth-first order, all children are processed before their parent
+        for child in reversed(nodes[1:]):
+            node = parents[child]
+            tree_edge = (self.adjacency[child][node], max(child, node), min(child, node))
+            shorter_edge, longer_edge = tree_edge, longest_edges[child]
+            if longer_edge < shorter_edge:
+                shorter_edge, longer_edge = longer_edge, shorter_edge
+            kept_edges.append(shorter_edge)
+            if longer_edge < longest_edges[node]:
+                dropped_edges.append(longest_edges[node])
+                longest_edges[node] = longer_edge
+            else:
+                dropped_edges.append(longer_edge)
+        kept_edges.append(longest_edges[root])
+
+        edges_to_add = [edge for edge in kept_edges if edge[1] == new_idx]
+        edges_to_remove = [
+            edge for edge in dropped_edges if edge[1] != new_idx and edge[0] != no_edge
+        ]
+
+        return edges_to_add, edges_to_remove
+
+    def add_edge(self, node1: int, node2: int, squared_distance: int) -> None:
+        self.adjacency[node1][node2] = squared_distance
+        self.adjacency[node2][node1] = squared_distance
+        heapq.heappush(
+            self.edge_heap, (-squared_distance, -max(node1, node2), -min(node1, node2))
+        )
+
+    def remove_edge(self, node1: int, node2: int) -> None:
+        del self.adjacency[node1][node2]
+        del self.adjacency[node2][node1]
+
+    def insert(self, point: np.ndarray | list[int]) -> int:
+        # Insert a junction box and return its index
+        point = np.asarray(point, dtype=np.int64).reshape(3)
+        candidate_idcs, squared_distances = self.get_candidates(point)
+
+        new_idx = self.num_points
+        if new_idx == len(self.points):
+            self.points = np.concatenate([self.points, np.zeros_like(self.points)])
+        self.points[new_idx] = point
+        self.num_points += 1
+        if self.cell_size is not None:
+            self.cells.setdefault(self.get_cell(point), []).append(new_idx)
+        self.adjacency.append({})
+        self.dsu.add_node()
+
+        # Only the trees that contain a candidate can change
+        squared_distances = dict(zip(candidate_idcs.tolist(), squared_distances.tolist()))
+        if self.dsu.num_components == 2:
+            # All previous junction boxes are connected already => Just one tree to update
+            roots = {0: int(candidate_idcs[0])} if len(candidate_idcs) > 0 else {}
+        else:
+            roots = {self.dsu.find(idx): idx for idx in candidate_idcs.tolist()}
+        for idx in roots.values():
+            edges_to_add, edges_to_remove = self.update_tree(new_idx, idx, squared_distances)
+            for _, node1, node2 in edges_to_remove:
+                self.remove_edge(node1, node2)
+            for squared_distance, node1, node2 in edges_to_add:
+                self.add_edge(node1, node2, squared_distance)
+        for idx in roots.values():
+            self.dsu.union(new_idx, idx)
+
+        return new_idx
+
+    def get_clusters(self) -> list[set]:
+        return self.dsu.get_clusters()
+
+    def get_cluster_sizes(self) -> list[int]:
+        # Like `get_clusters`, sizes of the clusters with at least two junction boxes
+        roots = {self.dsu.find(node) for node in range(self.num_points)}
+        return [self.dsu.sizes[root] for root in roots if self.dsu.sizes[root] > 1]
+
+    def get_last_connecting_edge(self) -> tuple[int, int] | None:
+        """
+        Return the edge that `connect_junctions` would connect last, i.e., the longest edge of
+        the forest, if the forest is a single tree that contains all junction boxes. Otherwise
+        (e.g., if the cut-off distance is too small), return None.
+
+        """
+        if self.num_points < 2 or self.dsu.num_components > 1:
+            return None
+        while True:
+            _, neg_idx1, neg_idx2 = self.edge_heap[0]
+            if -neg_idx2 in self.adjacency[-neg_idx1]:
+                return -neg_idx1, -neg_idx2
+            heapq.heappop(self.edge_heap)
 
 
 def multiply_size_of_n_largest_clusters(clusters: list[set], n: int = 3) -> int:
-    return math.prod(sorted(map(len, clusters), reverse=True)[:n])
+    return math.prod(heapq.nlargest(n, map(len, clusters)))
 
 
 def multiply_x_coords_of_last_cluster_connecting_edge(
@@ -115,7 +845,7 @@ if __name__ == "__main__":
 
     # PART 1
     start = time.perf_counter()
-    junction_box_distance_map = build_distance_map(junction_box_positions)
+    junction_box_distance_map = build_condensed_distance_map(junction_box_positions)
     res = multiply_size_of_n_largest_clusters(
         connect_junctions(junction_box_distance_map, 1000)[0]
     )
@@ -129,3 +859,30 @@ if __name__ == "__main__":
     )
     end = time.perf_counter()
     print(f"Part 2 Result: {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 1 (SPATIAL INDEX)
+    start = time.perf_counter()
+    res = multiply_size_of_n_largest_clusters(
+        connect_junctions_spatial(junction_box_positions, 1000)[0]
+    )
+    end = time.perf_counter()
+    print(f"Part 1 Result (spatial index): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (SPATIAL INDEX)
+    start = time.perf_counter()
+    res = multiply_x_coords_of_last_cluster_connecting_edge(
+        connect_junctions_spatial(junction_box_positions, None)[1], junction_box_positions
+    )
+    end = time.perf_counter()
+    print(f"Part 2 Result (spatial index): {res}. Took {(end - start) * 1000:.2f} ms.")
+
+    # PART 2 (ONLINE)
+    start = time.perf_counter()
+    clustering = OnlineJunctionClustering()
+    for junction_box_position in junction_box_positions:
+        clustering.insert(junction_box_position)
+    res = multiply_x_coords_of_last_cluster_connecting_edge(
+        clustering.get_last_connecting_edge(), junction_box_positions
+    )
+    end = time.perf_counter()
+    print(f"Part 2 Result (online): {res}. Took {(end - start) * 1000:.2f} ms.")
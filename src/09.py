@@ -19,14 +19,71 @@ def parse_input(text: str) -> list[np.ndarray]:
 
 
 def build_area_map(points: list[np.ndarray]) -> np.ndarray:
-    area_map = np.zeros((len(points), len(points)), dtype=int)
-    for i, p1 in enumerate(points):
-        for j, p2 in enumerate(points):
-            if j >= i:
-                continue
-            area_map[i, j] = (np.abs(p1 - p2) + np.array([1, 1])).prod()
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    area_map = (np.abs(points[:, None, :] - points[None, :, :]) + 1).prod(axis=2)
 
-    return area_map
+    # Like before, only the lower triangle (j < i) holds the areas
+    return np.tril(area_map, k=-1)
+
+
+def get_max_pairwise_area(
+    points1: np.ndarray, points2: np.ndarray, max_block_size: int = 1 << 22
+) -> int:
+    # Largest rectangle spanned by a point of `points1` and a point of `points2`. The rows of the
+    # area matrix are computed in blocks of roughly `max_block_size` entries.
+    block_length = max(1, max_block_size // max(1, len(points2)))
+    max_area = 0
+    for block_start in range(0, len(points1), block_length):
+        block = points1[block_start:block_start + block_length]
+        areas = (np.abs(block[:, None, :] - points2[None, :, :]) + 1).prod(axis=2)
+        max_area = max(max_area, int(areas.max(initial=0)))
+
+    return max_area
+
+
+def get_staircase(points: np.ndarray, signs: tuple[int, int]) -> np.ndarray:
+    """
+    Return the points for which no other point lies further in the direction of `signs`, e.g.,
+    for signs (-1, -1), the points without any other point to their lower left (coordinates less
+    than or equal to theirs). Sorted by the first coordinate, these points form a staircase.
+
+    """
+    oriented_points = points * np.array(signs)
+    order = np.lexsort((-oriented_points[:, 1], -oriented_points[:, 0]))
+    # Going from the most extreme first coordinate to the least extreme one, a point is on the
+    # staircase if its second coordinate is more extreme than that of all points before it
+    ys = oriented_points[order, 1]
+    max_prev_ys = np.maximum.accumulate(np.concatenate([[ys[0] - 1], ys[:-1]]))
+
+    return points[order[ys > max_prev_ys]]
+
+
+def get_max_rectangle_area(
+    points: np.ndarray | list[np.ndarray], prune: bool = True, max_block_size: int = 1 << 22
+) -> int:
+    """
+    Vectorized counterpart of `build_area_map(points).max()` that never materializes the full
+    area map. If `prune` is True, only the staircases of the points are paired: Of the largest
+    rectangle, one corner is to the lower left (or upper left) of the other one. If there were
+    another point to the lower left (upper left) of that corner, the rectangle spanned by this
+    point and the opposite corner would be even larger. So, the corners of the largest rectangle
+    lie on the lower-left and upper-right (or upper-left and lower-right) staircases.
+
+    """
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    if len(points) < 2:
+        return 0
+    if not prune:
+        return get_max_pairwise_area(points, points, max_block_size)
+
+    return max(
+        get_max_pairwise_area(
+            get_staircase(points, (-1, -1)), get_staircase(points, (1, 1)), max_block_size
+        ),
+        get_max_pairwise_area(
+            get_staircase(points, (-1, 1)), get_staircase(points, (1, -1)), max_block_size
+        ),
+    )
 
 
 def compress_points(
@@ -106,10 +163,30 @@ def fill_contour(grid_points: list[np.ndarray]) -> np.ndarray:
     return floodfill(arr)
 
 
+def build_summed_area_table(grid: np.ndarray) -> np.ndarray:
+    # table[i, j] is the sum of grid[:i, :j], so that the sum over any rectangle can be looked up
+    # with four reads
+    table = np.zeros((grid.shape[0] + 1, grid.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = grid.cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+
+    return table
+
+
+def get_rectangle_sums(table: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    # Sums over the rectangles with the (inclusive) corners `lower` and `upper`, both (n, 2)
+    return (
+        table[upper[:, 0] + 1, upper[:, 1] + 1]
+        - table[lower[:, 0], upper[:, 1] + 1]
+        - table[upper[:, 0] + 1, lower[:, 1]]
+        + table[lower[:, 0], lower[:, 1]]
+    )
+
+
 def find_area_of_largest_filled_rectangle(
     compressed_points: list[np.ndarray],
     compressed_to_orig_x_coords_mapping: dict[int, int],
     compressed_to_orig_y_coords_mapping: dict[int, int],
+    batch_size: int = 1 << 12,
 ) -> int:
     """
     The approach to find the largest rectangle that is filled (i.e., consists of red or green tiles
@@ -122,46 +199,38 @@ def find_area_of_largest_filled_rectangle(
     Accordingly, we can also tell from the compressed coordinates whether a rectangle consists of
     red or green tiles only. For the calculation of the rectangles' areas, however, we have to
     transform the compressed coordinates back to the original ones.
+    To check a rectangle in constant time, we count the tiles outside the contour that it contains
+    using a summed-area table. The rectangles are checked in batches, starting with the largest
+    ones, so that we can stop at the first batch that contains a filled rectangle.
 
     """
     # Red or green tiles are where filled_grid is equal to 2 (contour defined by the red tiles)
     # or 1 (interior of the contour)
     filled_grid = fill_contour(compressed_points)
-    max_area = 0
-    for i, p1 in enumerate(compressed_points):
-        for j, p2 in enumerate(compressed_points):
-            if j >= i:
-                continue
-            if p2[0] >= p1[0]:
-                x_lower = p1[0]
-                x_upper = p2[0]
-            else:
-                x_lower = p2[0]
-                x_upper = p1[0]
-            if p2[1] >= p1[1]:
-                y_lower = p1[1]
-                y_upper = p2[1]
-            else:
-                y_lower = p2[1]
-                y_upper = p1[1]
-            if (filled_grid[x_lower:x_upper + 1, y_lower:y_upper + 1] == 0).any():
-                continue
-            area = (
-                (
-                    compressed_to_orig_x_coords_mapping[x_upper] -
-                    compressed_to_orig_x_coords_mapping[x_lower]
-                    + 1
-                ) *
-                (
-                    compressed_to_orig_y_coords_mapping[y_upper] -
-                    compressed_to_orig_y_coords_mapping[y_lower]
-                    + 1
-                )
-            )
-            if area > max_area:
-                max_area = area
+    outside_cells_table = build_summed_area_table(filled_grid == 0)
 
-    return max_area
+    points = np.asarray(compressed_points, dtype=np.int64).reshape(-1, 2)
+    compressed_to_orig_coords = np.zeros((2, max(filled_grid.shape) + 1), dtype=np.int64)
+    for axis, mapping in enumerate(
+        [compressed_to_orig_x_coords_mapping, compressed_to_orig_y_coords_mapping]
+    ):
+        compressed_to_orig_coords[axis, list(mapping.keys())] = list(mapping.values())
+
+    i_idcs, j_idcs = np.tril_indices(len(points), k=-1)
+    lower = np.minimum(points[i_idcs], points[j_idcs])
+    upper = np.maximum(points[i_idcs], points[j_idcs])
+    areas = (
+        compressed_to_orig_coords[[0, 1], upper] - compressed_to_orig_coords[[0, 1], lower] + 1
+    ).prod(axis=1)
+    order = np.argsort(-areas, kind="stable")
+    for batch_start in range(0, len(order), batch_size):
+        batch = order[batch_start:batch_start + batch_size]
+        is_filled = get_rectangle_sums(outside_cells_table, lower[batch], upper[batch]) == 0
+        if is_filled.any():
+            # The batch is sorted by area => The first filled rectangle is the largest one
+            return int(areas[batch[is_filled.argmax()]])
+
+    return 0
 
 
 if __name__ == "__main__":
@@ -176,6 +245,12 @@ if __name__ == "__main__":
     end = time.perf_counter()
     print(f"Part 1 Result: {res}. Took {(end - start) * 1000:.2f} ms.")
 
+    # PART 1 (PRUNED)
+    start = time.perf_counter()
+    res = get_max_rectangle_area(red_tiles)
+    end = time.perf_counter()
+    print(f"Part 1 Result (pruned): {res}. Took {(end - start) * 1000:.2f} ms.")
+
     # PART 2
     start = time.perf_counter()
     res = find_area_of_largest_filled_rectangle(*compress_points(red_tiles))
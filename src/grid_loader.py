@@ -0,0 +1,99 @@
+import numpy as np
+
+NEWLINE_BYTES = b"\r\n"
+
+
+def build_lookup_table(
+    char_to_int_mapping: dict[str, int], dtype: type = np.uint8
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return a 256-entry lookup table that maps every byte to its integer value, together with a
+    mask of the bytes that are actually contained in `char_to_int_mapping`. Indexing the table
+    with a uint8 character matrix converts the whole matrix without any per-cell Python work.
+
+    """
+    lookup_table = np.zeros(256, dtype=dtype)
+    valid_bytes = np.zeros(256, dtype=bool)
+    for char, value in char_to_int_mapping.items():
+        lookup_table[ord(char)] = value
+        valid_bytes[ord(char)] = True
+
+    return lookup_table, valid_bytes
+
+
+def find_first_newline(data: np.ndarray, block_size: int = 1 << 20) -> int:
+    # Search block-wise, so that we don't need a boolean mask of the whole (memory-mapped) buffer
+    for block_start in range(0, len(data), block_size):
+        newline_idcs = np.flatnonzero(data[block_start:block_start + block_size] == ord("\n"))
+        if len(newline_idcs) > 0:
+            return block_start + int(newline_idcs[0])
+
+    return -1
+
+
+def get_char_matrix(data: np.ndarray) -> np.ndarray:
+    """
+    View a flat uint8 buffer of equally long lines as a (rows, cols) character matrix without
+    copying it. Leading and trailing newlines are ignored, and both "\n" and "\r\n" line endings
+    are supported.
+
+    """
+    start = 0
+    end = len(data)
+    while start < end and data[start] in NEWLINE_BYTES:
+        start += 1
+    while end > start and data[end - 1] in NEWLINE_BYTES:
+        end -= 1
+    data = data[start:end]
+    if len(data) == 0:
+        return np.zeros((0, 0), dtype=np.uint8)
+
+    num_cols = find_first_newline(data)
+    if num_cols == -1:
+        return data.reshape(1, -1)
+    line_ending_length = 1
+    if num_cols > 0 and data[num_cols - 1] == ord("\r"):
+        num_cols -= 1
+        line_ending_length = 2
+    row_stride = num_cols + line_ending_length
+    num_rows, remainder = divmod(len(data) + line_ending_length, row_stride)
+    if remainder != 0 or (data[num_cols + line_ending_length - 1::row_stride] != ord("\n")).any():
+        raise ValueError("All lines of the grid must have the same length.")
+
+    return np.lib.stride_tricks.as_strided(
+        data, shape=(num_rows, num_cols), strides=(row_stride * data.strides[0], data.strides[0])
+    )
+
+
+def convert_char_matrix(
+    char_matrix: np.ndarray, lookup_table: tuple[np.ndarray, np.ndarray], padding: int = 0
+) -> np.ndarray:
+    # Map the characters through `lookup_table` (as returned by `build_lookup_table`) and surround
+    # the result with a border of zeros that is `padding` cells wide
+    values, valid_bytes = lookup_table
+    is_valid = valid_bytes[char_matrix]
+    if not is_valid.all():
+        unknown_chars = np.unique(char_matrix[~is_valid])
+        raise ValueError(f"Unknown characters {[chr(c) for c in unknown_chars]} in grid.")
+    num_rows, num_cols = char_matrix.shape
+    grid = np.zeros((num_rows + 2 * padding, num_cols + 2 * padding), dtype=values.dtype)
+    grid[padding:padding + num_rows, padding:padding + num_cols] = values[char_matrix]
+
+    return grid
+
+
+def parse_grid(
+    text: str, lookup_table: tuple[np.ndarray, np.ndarray], padding: int = 0
+) -> np.ndarray:
+    data = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+
+    return convert_char_matrix(get_char_matrix(data), lookup_table, padding)
+
+
+def load_grid(
+    path: str, lookup_table: tuple[np.ndarray, np.ndarray], padding: int = 0
+) -> np.ndarray:
+    # Memory-map the input file instead of reading it into a Python string first
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+
+    return convert_char_matrix(get_char_matrix(data), lookup_table, padding)